@@ -0,0 +1,211 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted to the model in time."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, class_key: str):
+        self.class_key = class_key
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        max_per_class: int = 4,
+        max_queue: int = 32,
+        queue_timeout: float = 20.0
+    ):
+        """
+        Initialize admission control for model calls.
+
+        Limits apply per process, so with several gunicorn workers the
+        effective global limit is max_concurrent times the worker count.
+
+        Args:
+            max_concurrent: Maximum number of model calls running at once
+            max_per_class: Maximum number of model calls running at once for one class
+            max_queue: Maximum number of requests waiting for a slot
+            queue_timeout: Default number of seconds a request may wait for a slot
+        """
+        self.max_concurrent = max_concurrent
+        self.max_per_class = max_per_class
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._active_by_class: Dict[str, int] = {}
+        # Waiters per class, served round-robin across classes
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._queued = 0
+
+        # Moving average of how long a slot is held, used for retry hints
+        self._avg_service_time = 5.0
+
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Create an admission controller configured from environment variables."""
+        return cls(
+            max_concurrent=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            max_per_class=int(os.getenv("LLM_MAX_CONCURRENCY_PER_CLASS", "4")),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+            queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))
+        )
+
+    def _can_run(self, class_key: str) -> bool:
+        return (
+            self._active < self.max_concurrent and
+            self._active_by_class.get(class_key, 0) < self.max_per_class
+        )
+
+    def _start(self, class_key: str) -> None:
+        self._active += 1
+        self._active_by_class[class_key] = self._active_by_class.get(class_key, 0) + 1
+        self.admitted += 1
+
+    def _retry_after(self) -> int:
+        waves = (self._queued + 1) / max(1, self.max_concurrent)
+        return max(1, math.ceil(waves * self._avg_service_time))
+
+    def _dispatch(self) -> None:
+        # Grant free slots to waiting classes in round-robin order
+        while self._queued and self._active < self.max_concurrent:
+            granted = False
+
+            for class_key in list(self._queues.keys()):
+                queue = self._queues[class_key]
+                if not self._can_run(class_key):
+                    continue
+
+                waiter = queue.popleft()
+                self._queued -= 1
+                waiter.granted = True
+                self._start(class_key)
+                waiter.event.set()
+
+                # Move this class to the back so other classes go next
+                del self._queues[class_key]
+                if queue:
+                    self._queues[class_key] = queue
+
+                granted = True
+                break
+
+            if not granted:
+                break
+
+    def acquire(self, class_key: str, timeout: Optional[float] = None) -> None:
+        """
+        Wait for a model call slot.
+
+        Args:
+            class_key: Class the request belongs to
+            timeout: Seconds to wait before giving up (optional)
+
+        Raises:
+            AdmissionRejected: If the queue is full or the deadline passes
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+
+        with self._lock:
+            if not self._queued and self._can_run(class_key):
+                self._start(class_key)
+                return
+
+            if self._queued >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise AdmissionRejected(
+                    "The assistant is busy right now. Please try again shortly.",
+                    status_code=429,
+                    retry_after=self._retry_after()
+                )
+
+            waiter = _Waiter(class_key)
+            self._queues.setdefault(class_key, deque()).append(waiter)
+            self._queued += 1
+
+            # A slot may be free for this class even though others are waiting
+            self._dispatch()
+
+        waiter.event.wait(timeout)
+
+        with self._lock:
+            if waiter.granted:
+                return
+
+            queue = self._queues.get(class_key)
+            if queue is not None:
+                queue.remove(waiter)
+                self._queued -= 1
+                if not queue:
+                    del self._queues[class_key]
+
+            self.rejected_timeout += 1
+            raise AdmissionRejected(
+                "The assistant is under heavy load. Please try again shortly.",
+                status_code=503,
+                retry_after=self._retry_after()
+            )
+
+    def release(self, class_key: str, service_time: Optional[float] = None) -> None:
+        """
+        Release a model call slot.
+
+        Args:
+            class_key: Class the request belongs to
+            service_time: Seconds the slot was held (optional, used for retry hints)
+        """
+        with self._lock:
+            self._active -= 1
+            self._active_by_class[class_key] -= 1
+            if not self._active_by_class[class_key]:
+                del self._active_by_class[class_key]
+
+            if service_time is not None:
+                self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * service_time
+
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, class_key: str, timeout: Optional[float] = None) -> Iterator[None]:
+        """Context manager that holds a model call slot for the duration of the block."""
+        self.acquire(class_key, timeout)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(class_key, time.monotonic() - start_time)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get current admission control statistics."""
+        with self._lock:
+            return {
+                "active": self._active,
+                "queued": self._queued,
+                "active_by_class": dict(self._active_by_class),
+                "queued_by_class": {k: len(q) for k, q in self._queues.items()},
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "avg_service_time": round(self._avg_service_time, 3)
+            }
@@ -1,6 +1,7 @@
 import os
 import tempfile
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session, Response, stream_with_context, send_file
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import functools
@@ -8,6 +9,17 @@ import functools
 from doc_proc import DocumentProcessor
 from vector_store import VectorStoreManager
 from rag_chatbot import CourseAssistantChatbot
+from storage import get_data_dir, get_collection_name
+from upload_manager import ChunkedUploadManager, UploadError, SNAPSHOT_DOCUMENT_TYPE
+from chunking import DEFAULT_CHUNKING_PROFILE, list_chunking_profiles
+from admission import AdmissionRejected
+from resilient import get_all_metrics
+from batch_qa import BatchQuestionRunner, parse_questions, BATCH_MAX_CONCURRENCY
+from faq_cache import parse_faq_entries, delete_faq_cache
+from class_snapshot import SnapshotError, export_class_snapshot, import_class_snapshot
+from storage_maintenance import StorageMaintenance
+from embedding_providers import EMBEDDING_PROVIDERS
+import json
 
 # Load environment variables
 load_dotenv()
@@ -15,11 +27,11 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "default-secret-key")
 
-# Configure upload folder
-UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Configure upload folder (on the Railway volume when available)
+UPLOAD_FOLDER = get_data_dir('uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max file size
+# 16 MB max request size. Larger files go through the chunked upload endpoints.
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf'}
@@ -28,11 +40,47 @@ ALLOWED_EXTENSIONS = {'pdf'}
 processor = DocumentProcessor()
 vector_store = VectorStoreManager()
 chatbot = CourseAssistantChatbot()
+upload_manager = ChunkedUploadManager(UPLOAD_FOLDER)
+storage_maintenance = StorageMaintenance(vector_store, upload_folder=UPLOAD_FOLDER)
+
+# FAQ answers take a model call per question, so they are generated after the response is sent
+faq_build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faq-build")
 
 # Helper functions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def build_faq_cache(class_name, faq_entries):
+    # Answer the instructor's FAQ list now so students get these answers instantly
+    if not faq_entries:
+        return None
+    try:
+        return chatbot.faq_cache.build(chatbot, class_name, faq_entries)
+    except Exception as e:
+        print(f"Error building FAQ cache for class '{class_name}': {e}")
+        return None
+
+def schedule_faq_build(class_name, faq_entries):
+    # Build the FAQ cache in the background; answers show up in GET /faq/<class_name> when ready
+    if not faq_entries:
+        return None
+    faq_build_executor.submit(build_faq_cache, class_name, faq_entries)
+    return {"questions": len(faq_entries), "status": "building"}
+
+def read_faq_file(file):
+    # FAQ lists are plain text (one question per line) or JSONL
+    if not file or not file.filename:
+        return []
+    return parse_faq_entries(file.read().decode('utf-8').splitlines())
+
+@app.errorhandler(AdmissionRejected)
+def handle_admission_rejected(e):
+    # Fail fast with a retry hint instead of letting requests pile up
+    response = jsonify({"error": str(e), "retry_after": e.retry_after})
+    response.status_code = e.status_code
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 # Authentication decorator
 def login_required(f):
     @functools.wraps(f)
@@ -97,20 +145,34 @@ def chat():
             return jsonify({"error": "No data provided"}), 400
         
         class_name = data.get('class_name')
+        class_names = data.get('class_names') or []
         question = data.get('question')
         
-        if not class_name or not question:
+        if not isinstance(class_names, list) or not all(isinstance(name, str) and name for name in class_names):
+            return jsonify({"error": "class_names must be a list of class names"}), 400
+        
+        if not class_name and class_names:
+            class_name = class_names[0]
+        
+        if not isinstance(class_name, str) or not class_name or not isinstance(question, str) or not question:
             return jsonify({"error": "Class name and question are required"}), 400
         
         # Get conversation history from session or initialize empty list
         conversation_history = session.get('conversation_history', [])
         
-        # Generate response
-        response = chatbot.generate_response(
-            class_name=class_name,
-            question=question,
-            chat_history=conversation_history
-        )
+        # Generate response, searching several classes if requested
+        if len(set([class_name] + class_names)) > 1:
+            response = chatbot.generate_multi_class_response(
+                class_names=[class_name] + class_names,
+                question=question,
+                chat_history=conversation_history
+            )
+        else:
+            response = chatbot.generate_response(
+                class_name=class_name,
+                question=question,
+                chat_history=conversation_history
+            )
         
         # Add to conversation history
         conversation_history.append((question, response["answer"]))
@@ -127,6 +189,7 @@ def chat():
             "answer": response["answer"],
             "sources": response["sources"],
             "tokens_used": response["tokens_used"],
+            "cached_tokens": response.get("cached_tokens", 0),
             "cost": response["cost"]
         })
     
@@ -145,6 +208,11 @@ def chat():
 def add_class():
     if request.method == 'POST':
         class_name = request.form.get('class_name')
+        chunking_profile = request.form.get('chunking_profile') or DEFAULT_CHUNKING_PROFILE
+        
+        if chunking_profile not in list_chunking_profiles():
+            flash('Please select a valid chunking profile.')
+            return redirect(url_for('add_class'))
         
         if not class_name:
             flash('Please enter a class name.')
@@ -159,6 +227,12 @@ def add_class():
             flash('Please upload at least one file.')
             return redirect(url_for('add_class'))
         
+        try:
+            faq_entries = read_faq_file(request.files.get('faq_questions'))
+        except ValueError:
+            flash('The FAQ file could not be read. Use one question per line or JSONL.')
+            return redirect(url_for('add_class'))
+        
         # Create temporary directories
         with tempfile.TemporaryDirectory() as temp_dir:
             textbook_path = None
@@ -206,10 +280,15 @@ def add_class():
                 class_name=class_name,
                 textbook_path=textbook_path if textbook_path and os.path.exists(textbook_path) else None,
                 lecture_notes_dir=lecture_notes_dir if os.listdir(lecture_notes_dir) else None,
-                assignments_dir=assignments_dir if os.listdir(assignments_dir) else None
+                assignments_dir=assignments_dir if os.listdir(assignments_dir) else None,
+                chunking_profile=chunking_profile
             )
             
             if success:
+                faq_summary = schedule_faq_build(class_name, faq_entries)
+                if faq_summary:
+                    flash(f'Answering {faq_summary["questions"]} FAQ questions in the background.')
+                
                 flash(f'Successfully added class "{class_name}".')
                 # Reset session data for the new class
                 session.pop('conversation_history', None)
@@ -219,7 +298,125 @@ def add_class():
                 flash('Error processing class materials. Please try again.')
                 return redirect(url_for('add_class'))
     
-    return render_template('add_class.html')
+    return render_template(
+        'add_class.html',
+        chunking_profiles=list_chunking_profiles(),
+        default_chunking_profile=DEFAULT_CHUNKING_PROFILE
+    )
+
+@app.route('/upload', methods=['POST'])
+@login_required
+def create_upload():
+    data = request.get_json()
+
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    if not data.get('class_name'):
+        return jsonify({"error": "Class name is required"}), 400
+
+    if data.get('document_type') == SNAPSHOT_DOCUMENT_TYPE:
+        if not data.get('filename', '').lower().endswith('.zip'):
+            return jsonify({"error": "Snapshots must be .zip files"}), 400
+    elif not allowed_file(data.get('filename', '')):
+        return jsonify({"error": "Only PDF files are allowed"}), 400
+
+    try:
+        upload_session = upload_manager.create_upload(
+            filename=data.get('filename'),
+            total_size=int(data.get('total_size', 0)),
+            class_name=data['class_name'],
+            document_type=data.get('document_type'),
+            sha256=data.get('sha256')
+        )
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid file size"}), 400
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    return jsonify(upload_session), 201
+
+@app.route('/upload/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+@login_required
+def upload_chunk(upload_id):
+    try:
+        if request.method == 'GET':
+            return jsonify(upload_manager.get_upload_status(upload_id))
+
+        if request.method == 'DELETE':
+            if not upload_manager.abort_upload(upload_id):
+                return jsonify({"error": "Upload not found"}), 404
+            return jsonify({"status": "success", "message": "Upload aborted"})
+
+        # Stream the raw request body to disk without buffering it in memory
+        offset = int(request.args.get('offset', request.headers.get('X-Upload-Offset', 0)))
+        upload_session = upload_manager.write_chunk(
+            upload_id,
+            offset=offset,
+            stream=request.stream,
+            chunk_sha256=request.headers.get('X-Chunk-SHA256')
+        )
+        return jsonify(upload_session)
+    except ValueError:
+        return jsonify({"error": "Invalid offset"}), 400
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+@app.route('/upload/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    try:
+        upload_session = upload_manager.complete_upload(upload_id)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    return jsonify(upload_session)
+
+@app.route('/add-class/ingest-uploads', methods=['POST'])
+@login_required
+def ingest_uploads():
+    data = request.get_json()
+
+    if not data or not data.get('class_name'):
+        return jsonify({"error": "Class name is required"}), 400
+
+    class_name = data['class_name']
+    chunking_profile = data.get('chunking_profile') or DEFAULT_CHUNKING_PROFILE
+    materials = upload_manager.get_staged_materials(class_name)
+    
+    if chunking_profile not in list_chunking_profiles():
+        return jsonify({"error": "Invalid chunking profile"}), 400
+
+    if not any(materials.values()):
+        return jsonify({"error": "No completed uploads found for this class"}), 400
+
+    try:
+        faq_entries = parse_faq_entries((data.get('faq_text') or '').splitlines())
+    except ValueError:
+        return jsonify({"error": "Invalid FAQ list"}), 400
+
+    success = processor.process_class_materials(
+        class_name=class_name,
+        chunking_profile=chunking_profile,
+        **materials
+    )
+
+    if not success:
+        return jsonify({"error": "Error processing class materials"}), 500
+
+    upload_manager.clear_staged_materials(class_name)
+    faq_summary = schedule_faq_build(class_name, faq_entries)
+
+    # Reset session data for the new class
+    session.pop('conversation_history', None)
+    session['current_class'] = class_name
+
+    return jsonify({
+        "status": "success",
+        "message": f'Successfully added class "{class_name}".',
+        "faq": faq_summary,
+        "redirect": url_for('chat', class_name=class_name)
+    })
 
 @app.route('/reset-chat', methods=['POST'])
 @login_required
@@ -280,6 +477,262 @@ def delete_class(class_name):
     else:
         return jsonify({"error": "Failed to delete class"}), 500
 
+@app.route('/rebuild-class/<class_name>', methods=['POST'])
+@login_required
+def rebuild_class(class_name):
+    data = request.get_json(silent=True) or {}
+    chunking_profile = data.get('chunking_profile')
+    embedding_provider = data.get('embedding_provider')
+    
+    if chunking_profile and chunking_profile not in list_chunking_profiles():
+        return jsonify({"error": "Invalid chunking profile"}), 400
+    
+    if embedding_provider and embedding_provider not in EMBEDDING_PROVIDERS:
+        return jsonify({"error": "Invalid embedding provider"}), 400
+    
+    # Re-chunk and re-embed from cached page text, optionally with a different embedding model
+    success = processor.rebuild_class_from_cache(
+        class_name,
+        chunking_profile=chunking_profile,
+        embedding_provider=embedding_provider,
+        embedding_model=data.get('embedding_model')
+    )
+    
+    if not success:
+        return jsonify({"error": "Failed to rebuild class from cache"}), 500
+    
+    # Regenerate FAQ answers against the new chunks, keeping instructor-written answers
+    faq_entries = [
+        {"question": entry["question"], "answer": entry["answer"] if entry.get("origin") == "instructor" else None}
+        for entry in chatbot.faq_cache.list_entries(class_name)
+    ]
+    faq_summary = schedule_faq_build(class_name, faq_entries)
+    
+    return jsonify({"status": "success", "message": f"Class '{class_name}' rebuilt successfully", "faq": faq_summary})
+
+@app.route('/faq/<class_name>', methods=['GET', 'POST', 'DELETE'])
+@login_required
+def faq(class_name):
+    if request.method == 'GET':
+        return jsonify(chatbot.faq_cache.list_entries(class_name))
+    
+    if request.method == 'DELETE':
+        delete_faq_cache(class_name)
+        return jsonify({"status": "success", "message": f"FAQ answers for '{class_name}' cleared"})
+    
+    if not vector_store.get_class_info(class_name).get('exists', False):
+        return jsonify({"error": "Class not found"}), 404
+    
+    # Replace the FAQ list from an uploaded file or a JSON list of questions
+    try:
+        if 'faq_questions' in request.files:
+            faq_entries = read_faq_file(request.files['faq_questions'])
+        else:
+            data = request.get_json(silent=True) or {}
+            faq_entries = [
+                {"question": q.strip(), "answer": None}
+                for q in data.get('questions', []) if isinstance(q, str) and q.strip()
+            ]
+    except ValueError:
+        return jsonify({"error": "Invalid FAQ list"}), 400
+    
+    if not faq_entries:
+        return jsonify({"error": "No questions provided"}), 400
+    
+    faq_summary = build_faq_cache(class_name, faq_entries)
+    
+    if faq_summary is None:
+        return jsonify({"error": "Failed to build FAQ answers"}), 500
+    
+    return jsonify({"status": "success", "faq": faq_summary})
+
+@app.route('/export-class/<class_name>')
+@login_required
+def export_class(class_name):
+    fd, snapshot_path = tempfile.mkstemp(suffix='.zip', dir=UPLOAD_FOLDER)
+    os.close(fd)
+    
+    try:
+        export_class_snapshot(vector_store, class_name, snapshot_path)
+    except SnapshotError as e:
+        os.remove(snapshot_path)
+        return jsonify({"error": str(e)}), e.status_code
+    
+    # The open file stays readable after unlinking, so nothing is left behind once it's sent
+    snapshot_file = open(snapshot_path, 'rb')
+    os.remove(snapshot_path)
+    
+    return send_file(
+        snapshot_file,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f"{get_collection_name(class_name)}.snapshot.zip"
+    )
+
+@app.route('/import-class', methods=['POST'])
+@login_required
+def import_class():
+    # Small snapshots can be posted directly; larger ones go through the chunked upload endpoints
+    upload_session = None
+    temp_path = None
+    
+    if 'snapshot' in request.files:
+        options = request.form
+        fd, temp_path = tempfile.mkstemp(suffix='.zip', dir=UPLOAD_FOLDER)
+        os.close(fd)
+        request.files['snapshot'].save(temp_path)
+        snapshot_path = temp_path
+    else:
+        options = request.get_json(silent=True) or {}
+        if not options.get('upload_id'):
+            return jsonify({"error": "A snapshot file or upload_id is required"}), 400
+        try:
+            upload_session = upload_manager.get_upload_status(options['upload_id'])
+        except UploadError as e:
+            return jsonify({"error": str(e)}), e.status_code
+        if not upload_session.get('completed') or upload_session.get('document_type') != SNAPSHOT_DOCUMENT_TYPE:
+            return jsonify({"error": "Upload is not a completed snapshot"}), 400
+        snapshot_path = upload_session['path']
+    
+    overwrite = str(options.get('overwrite', '')).lower() in ('1', 'true', 'yes')
+    
+    try:
+        result = import_class_snapshot(
+            vector_store,
+            snapshot_path,
+            class_name=options.get('class_name') or None,
+            overwrite=overwrite
+        )
+    except SnapshotError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    if upload_session:
+        upload_manager.abort_upload(upload_session['upload_id'])
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+    
+    return jsonify({"status": "success", **result})
+
+@app.route('/batch-questions/<class_name>', methods=['POST'])
+@login_required
+def batch_questions(class_name):
+    # Questions come from an uploaded file or a JSON list
+    if 'questions' in request.files:
+        try:
+            questions = parse_questions(request.files['questions'].read().decode('utf-8').splitlines())
+        except UnicodeDecodeError:
+            return jsonify({"error": "Questions file must be UTF-8 text"}), 400
+        concurrency = request.form.get('concurrency', 4)
+    else:
+        data = request.get_json(silent=True) or {}
+        questions = [q.strip() for q in data.get('questions', []) if isinstance(q, str) and q.strip()]
+        concurrency = data.get('concurrency', 4)
+    
+    if not questions:
+        return jsonify({"error": "No questions provided"}), 400
+    
+    try:
+        if isinstance(concurrency, bool):
+            raise ValueError(concurrency)
+        concurrency = int(concurrency)
+    except (TypeError, ValueError):
+        return jsonify({"error": "concurrency must be an integer"}), 400
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    
+    if get_collection_name(class_name) not in [get_collection_name(c) for c in chatbot.get_available_classes()]:
+        return jsonify({"error": f"Class '{class_name}' not found"}), 404
+    
+    runner = BatchQuestionRunner(chatbot, concurrency=concurrency)
+    
+    def generate():
+        # One JSON result per line, sent as soon as each answer is ready
+        results = runner.run(class_name, questions)
+        try:
+            for result in results:
+                yield json.dumps(result) + "\n"
+        finally:
+            # Stop queued questions if the client disconnects
+            results.close()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/storage')
+@login_required
+def storage_report():
+    # Disk usage per class plus what a cleanup would remove
+    return jsonify({
+        "usage": storage_maintenance.get_disk_usage(),
+        "orphans": storage_maintenance.find_orphans()
+    })
+
+@app.route('/storage/maintenance', methods=['POST'])
+@login_required
+def run_storage_maintenance():
+    data = request.get_json(silent=True) or {}
+    rebuild_classes = data.get('rebuild_index') or []
+    
+    if rebuild_classes == 'all':
+        rebuild_classes = chatbot.get_available_classes()
+    if not isinstance(rebuild_classes, list):
+        return jsonify({"error": "rebuild_index must be a list of class names or 'all'"}), 400
+    
+    # Nothing is changed unless an action is explicitly requested
+    vacuum = data.get('vacuum') is True
+    remove_orphans = data.get('remove_orphans') is True
+    
+    if not (vacuum or remove_orphans or rebuild_classes):
+        # Report what a cleanup would remove
+        result = storage_maintenance.run(vacuum=False, remove_orphans=True, dry_run=True)
+    else:
+        result = storage_maintenance.run(
+            vacuum=vacuum,
+            remove_orphans=remove_orphans,
+            rebuild_classes=rebuild_classes,
+            dry_run=data.get('dry_run') is True
+        )
+    
+    return jsonify(result)
+
+@app.route('/usage/summary')
+@login_required
+def usage_summary():
+    # Tokens, cost and latency grouped by class, day, model or source
+    class_name = request.args.get('class_name')
+    try:
+        rows = chatbot.usage_ledger.summarize(
+            group_by=request.args.get('group_by', 'class'),
+            days=request.args.get('days', 30, type=int),
+            class_name=get_collection_name(class_name) if class_name else None
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({"rows": rows, "writer": chatbot.usage_ledger.get_stats()})
+
+@app.route('/usage/top-questions')
+@login_required
+def usage_top_questions():
+    class_name = request.args.get('class_name')
+    return jsonify(chatbot.usage_ledger.top_questions(
+        class_name=get_collection_name(class_name) if class_name else None,
+        days=request.args.get('days', 30, type=int),
+        limit=min(request.args.get('limit', 20, type=int), 200)
+    ))
+
+@app.route('/admission-stats')
+@login_required
+def admission_stats():
+    return jsonify(chatbot.admission.get_stats())
+
+@app.route('/client-metrics')
+@login_required
+def client_metrics():
+    # Latency percentiles, retries and hedges for OpenAI calls
+    return jsonify(get_all_metrics())
+
 @app.template_filter('to_date')
 @login_required
 def to_date(timestamp):
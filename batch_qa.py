@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from dotenv import load_dotenv
+
+from admission import AdmissionRejected
+
+# Load environment variables
+load_dotenv()
+
+# Upper bound on concurrency a batch may request
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+
+def parse_questions(lines: Iterable[str]) -> List[str]:
+    """
+    Parse questions from plain text or JSONL lines.
+
+    Each line is either a question or a JSON object with a "question" field.
+    Blank lines and lines starting with '#' are skipped.
+
+    Args:
+        lines: Lines of the questions file
+
+    Returns:
+        List of questions
+    """
+    questions = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            question = json.loads(line).get("question", "").strip()
+            if question:
+                questions.append(question)
+        else:
+            questions.append(line)
+    return questions
+
+
+class BatchQuestionRunner:
+    def __init__(
+        self,
+        chatbot: Any,
+        concurrency: int = 4,
+        max_admission_retries: int = 5,
+        response_options: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initialize a batch question runner.
+
+        Args:
+            chatbot: CourseAssistantChatbot used to answer questions
+            concurrency: Number of questions answered at once
+            max_admission_retries: Times to wait and retry when the model is busy
+            response_options: Extra keyword arguments for generate_response (optional)
+        """
+        self.chatbot = chatbot
+        self.concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+        self.max_admission_retries = max_admission_retries
+        self.response_options = response_options or {}
+
+    def _answer(self, class_name: str, index: int, question: str, query_embedding: List[float]) -> Dict[str, Any]:
+        start_time = time.monotonic()
+
+        for attempt in range(self.max_admission_retries + 1):
+            try:
+                # Batch calls get their own admission queue so live students are served fairly
+                response = self.chatbot.generate_response(
+                    class_name=class_name,
+                    question=question,
+                    query_embedding=query_embedding,
+                    admission_key=f"batch:{class_name}",
+                    **{"usage_source": "batch", **self.response_options}
+                )
+                break
+            except AdmissionRejected as e:
+                if attempt == self.max_admission_retries:
+                    response = {"answer": None, "error": str(e), "sources": [], "tokens_used": 0, "cost": 0.0}
+                    break
+                time.sleep(e.retry_after)
+
+        return {
+            "index": index,
+            "question": question,
+            "answer": response.get("answer"),
+            "error": response.get("error"),
+            "sources": response.get("sources", []),
+            "retrieval": response.get("retrieval"),
+            "tokens_used": response.get("tokens_used", 0),
+            "prompt_tokens": response.get("prompt_tokens", 0),
+            "completion_tokens": response.get("completion_tokens", 0),
+            "cached_tokens": response.get("cached_tokens", 0),
+            "cost": response.get("cost", 0.0),
+            "latency_ms": round((time.monotonic() - start_time) * 1000, 1)
+        }
+
+    def run(
+        self,
+        class_name: str,
+        questions: List[str],
+        query_embeddings: Optional[List[List[float]]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Answer a list of questions for a class, yielding results as they complete.
+
+        All questions are embedded in one batched request, then retrieval and
+        model calls run on a bounded thread pool. Closing the iterator early
+        cancels the questions that haven't started yet.
+
+        Args:
+            class_name: Name of the class
+            questions: Questions to answer
+            query_embeddings: Precomputed question embeddings (optional)
+
+        Yields:
+            One result dictionary per question, in completion order
+        """
+        if not questions:
+            return
+
+        if query_embeddings is None:
+            embeddings = self.chatbot.vector_store_manager.get_class_embeddings(class_name)
+            query_embeddings = embeddings.embed_documents(questions)
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch")
+        futures = [
+            executor.submit(self._answer, class_name, index, question, embedding)
+            for index, (question, embedding) in enumerate(zip(questions, query_embeddings))
+        ]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # If the caller stops early (e.g. a client disconnects), don't start any more
+            # model calls; questions already being answered finish in the background
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def run_to_jsonl(self, class_name: str, questions: List[str], output: Any) -> Dict[str, Any]:
+        """
+        Answer questions and write each result as a JSON line.
+
+        Args:
+            class_name: Name of the class
+            questions: Questions to answer
+            output: Writable text file
+
+        Returns:
+            Summary with counts, totals and throughput
+        """
+        start_time = time.monotonic()
+        summary = {"questions": len(questions), "answered": 0, "errors": 0, "tokens_used": 0, "cost": 0.0}
+        latencies = []
+
+        for result in self.run(class_name, questions):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+            summary["answered" if result["error"] is None else "errors"] += 1
+            summary["tokens_used"] += result["tokens_used"]
+            summary["cost"] += result["cost"]
+            latencies.append(result["latency_ms"])
+
+        elapsed = time.monotonic() - start_time
+        latencies.sort()
+        summary.update({
+            "elapsed_seconds": round(elapsed, 2),
+            "questions_per_second": round(len(questions) / elapsed, 2) if elapsed else None,
+            "latency_p50_ms": latencies[len(latencies) // 2] if latencies else None,
+            "latency_p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        })
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions for a class and write results as JSONL.")
+    parser.add_argument("class_name", help="Name of the class")
+    parser.add_argument("questions", help="File with one question per line (or JSONL with a 'question' field)")
+    parser.add_argument("-o", "--output", help="Output JSONL file (defaults to stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4,
+                        help=f"Questions answered at once (max {BATCH_MAX_CONCURRENCY})")
+    args = parser.parse_args()
+
+    from rag_chatbot import CourseAssistantChatbot
+
+    with open(args.questions, "r") as f:
+        questions = parse_questions(f)
+
+    runner = BatchQuestionRunner(CourseAssistantChatbot(), concurrency=args.concurrency)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            summary = runner.run_to_jsonl(args.class_name, questions, output)
+    else:
+        summary = runner.run_to_jsonl(args.class_name, questions, sys.stdout)
+
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import json
+import argparse
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_chroma import Chroma
+
+from doc_proc import DocumentProcessor
+from dedup import ChunkDeduplicator, parse_source_refs, DUPLICATE_SOURCES_KEY
+from chunking import count_tokens, list_chunking_profiles
+
+# Load environment variables
+load_dotenv()
+
+# text-embedding-3-small produces 1536-dimensional float32 vectors
+EMBEDDING_DIMENSIONS = 1536
+# Approximate HNSW graph overhead per vector (M=16 links in both directions)
+HNSW_BYTES_PER_VECTOR = 16 * 2 * 4
+# text-embedding-3-small price per 1M tokens
+EMBEDDING_COST_PER_MILLION_TOKENS = 0.02
+
+
+def load_eval_questions(path: str) -> List[Dict[str, Any]]:
+    """
+    Load retrieval evaluation questions from a JSONL file.
+
+    Each line looks like {"question": "...", "filename": "book.pdf", "page": 12}.
+    """
+    questions = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                questions.append(json.loads(line))
+    return questions
+
+
+def _is_hit(doc: Document, expected: Dict[str, Any]) -> bool:
+    refs = [{"filename": doc.metadata.get("filename"), "page": str(doc.metadata.get("page"))}]
+    refs.extend(parse_source_refs(doc.metadata.get(DUPLICATE_SOURCES_KEY)))
+
+    for ref in refs:
+        if ref["filename"] != expected.get("filename"):
+            continue
+        if "page" not in expected or str(expected["page"]) == str(ref["page"]):
+            return True
+    return False
+
+
+def evaluate_retrieval(
+    processor: DocumentProcessor,
+    chunks: List[Document],
+    questions: List[Dict[str, Any]],
+    collection_name: str,
+    k: int = 5
+) -> Dict[str, float]:
+    """
+    Measure hit rate and MRR of chunks against evaluation questions.
+
+    Chunks are embedded into a temporary in-memory collection.
+    """
+    vector_store = Chroma(collection_name=collection_name, embedding_function=processor.embeddings)
+
+    try:
+        vector_store.add_documents(chunks)
+
+        hits = 0
+        reciprocal_rank_total = 0.0
+        for item in questions:
+            results = vector_store.similarity_search(item["question"], k=k)
+            for rank, doc in enumerate(results, 1):
+                if _is_hit(doc, item):
+                    hits += 1
+                    reciprocal_rank_total += 1.0 / rank
+                    break
+
+        return {
+            f"hit_rate@{k}": hits / len(questions),
+            "mrr": reciprocal_rank_total / len(questions)
+        }
+    finally:
+        vector_store.delete_collection()
+
+
+def report_profile(
+    processor: DocumentProcessor,
+    class_name: str,
+    profile: str,
+    questions: Optional[List[Dict[str, Any]]] = None,
+    k: int = 5
+) -> Optional[Dict[str, Any]]:
+    """
+    Chunk a class with a profile and report chunk count, index size and retrieval quality.
+
+    Args:
+        processor: Document processor (its page cache must contain the class materials)
+        class_name: Name of the class
+        profile: Chunking profile name
+        questions: Evaluation questions (optional)
+        k: Number of results to consider for retrieval quality
+
+    Returns:
+        Dictionary with the report, or None if the class can't be chunked from cache
+    """
+    chunks = processor.load_cached_chunks(class_name, chunking_profile=profile)
+
+    if chunks is None:
+        return None
+
+    if processor.deduplicate:
+        chunks = ChunkDeduplicator().deduplicate(chunks)
+
+    token_counts = [count_tokens(doc.page_content) for doc in chunks]
+    text_bytes = sum(len(doc.page_content.encode("utf-8")) for doc in chunks)
+    metadata_bytes = sum(len(json.dumps(doc.metadata)) for doc in chunks)
+    total_tokens = sum(token_counts)
+
+    report = {
+        "profile": profile,
+        "chunk_count": len(chunks),
+        "avg_chunk_tokens": round(total_tokens / len(chunks), 1) if chunks else 0,
+        "max_chunk_tokens": max(token_counts) if token_counts else 0,
+        "embedding_tokens": total_tokens,
+        "embedding_cost": total_tokens / 1_000_000 * EMBEDDING_COST_PER_MILLION_TOKENS,
+        "estimated_index_bytes": (
+            len(chunks) * (EMBEDDING_DIMENSIONS * 4 + HNSW_BYTES_PER_VECTOR) + text_bytes + metadata_bytes
+        )
+    }
+
+    if questions and chunks:
+        report.update(evaluate_retrieval(processor, chunks, questions, f"chunk_report_{profile}", k=k))
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunking profiles for a class using the page cache.")
+    parser.add_argument("class_name", help="Name of the class")
+    parser.add_argument("--profiles", default=",".join(list_chunking_profiles()),
+                        help="Comma-separated chunking profiles to compare")
+    parser.add_argument("--eval", dest="eval_path",
+                        help="JSONL file of {question, filename, page} for retrieval quality (embeds chunks)")
+    parser.add_argument("-k", type=int, default=5, help="Number of results for retrieval quality")
+    parser.add_argument("--json", action="store_true", help="Print reports as JSON")
+    args = parser.parse_args()
+
+    processor = DocumentProcessor()
+    questions = load_eval_questions(args.eval_path) if args.eval_path else None
+
+    reports = []
+    for profile in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+        report = report_profile(processor, args.class_name, profile, questions, k=args.k)
+        if report is None:
+            print(f"Could not chunk class '{args.class_name}' from the page cache")
+            return
+        reports.append(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    for report in reports:
+        print(f"\nProfile: {report['profile']}")
+        print(f"  Chunks: {report['chunk_count']} (avg {report['avg_chunk_tokens']} tokens, max {report['max_chunk_tokens']})")
+        print(f"  Embedding tokens: {report['embedding_tokens']} (${report['embedding_cost']:.4f})")
+        print(f"  Estimated index size: {report['estimated_index_bytes'] / (1024 * 1024):.2f} MB")
+        if f"hit_rate@{args.k}" in report:
+            print(f"  Hit rate@{args.k}: {report[f'hit_rate@{args.k}']:.2%}, MRR: {report['mrr']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from typing import Dict, Any, Iterable, Iterator, List
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+import tiktoken
+
+# Tokenizer used to measure chunk sizes (matches OpenAI embedding and chat models)
+TOKEN_ENCODING = "cl100k_base"
+
+# Separators tried in order. Headings come first so sections stay together,
+# then paragraphs and bullets so slides aren't split mid-bullet.
+HEADING_SEPARATORS = [
+    r"\n(?=#{1,6} )",
+    r"\n(?=(?:CHAPTER|Chapter|SECTION|Section)\s+\d)",
+    r"\n(?=\d+(?:\.\d+)+\s+[A-Z])",
+]
+PARAGRAPH_SEPARATORS = [r"\n\s*\n"]
+BULLET_SEPARATORS = [r"\n(?=\s*(?:[•▪●◦‣\-\*]|\d+[\.\)])\s)"]
+FALLBACK_SEPARATORS = [r"\n", r"(?<=[\.\?!])\s+", r" ", r""]
+
+# Chunk sizes are in tokens. Chunks never cross page boundaries, so slide
+# profiles use a size large enough to keep a whole slide in one chunk.
+CHUNKING_PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "balanced": {
+        "textbook": {"chunk_size": 600, "chunk_overlap": 60, "separators": "prose"},
+        "lecture_notes": {"chunk_size": 400, "chunk_overlap": 0, "separators": "slides"},
+        "assignments": {"chunk_size": 400, "chunk_overlap": 40, "separators": "slides"},
+    },
+    "compact": {
+        "textbook": {"chunk_size": 900, "chunk_overlap": 90, "separators": "prose"},
+        "lecture_notes": {"chunk_size": 600, "chunk_overlap": 0, "separators": "slides"},
+        "assignments": {"chunk_size": 600, "chunk_overlap": 60, "separators": "slides"},
+    },
+    "fine": {
+        "textbook": {"chunk_size": 300, "chunk_overlap": 40, "separators": "prose"},
+        "lecture_notes": {"chunk_size": 250, "chunk_overlap": 0, "separators": "slides"},
+        "assignments": {"chunk_size": 250, "chunk_overlap": 30, "separators": "slides"},
+    },
+    # Roughly the previous 1000/200 character splitter, kept for comparison
+    "legacy": {
+        "textbook": {"chunk_size": 250, "chunk_overlap": 50, "separators": "prose"},
+        "lecture_notes": {"chunk_size": 250, "chunk_overlap": 50, "separators": "prose"},
+        "assignments": {"chunk_size": 250, "chunk_overlap": 50, "separators": "prose"},
+    },
+}
+
+DEFAULT_CHUNKING_PROFILE = "balanced"
+
+# Chunks smaller than this (usually a lone heading) are merged into the next chunk
+MIN_CHUNK_TOKENS = 40
+
+_SEPARATOR_SETS = {
+    "prose": HEADING_SEPARATORS + PARAGRAPH_SEPARATORS + BULLET_SEPARATORS + FALLBACK_SEPARATORS,
+    "slides": HEADING_SEPARATORS + BULLET_SEPARATORS + PARAGRAPH_SEPARATORS + FALLBACK_SEPARATORS,
+}
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text with the chunking tokenizer."""
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def list_chunking_profiles() -> List[str]:
+    """Get the names of the available chunking profiles."""
+    return list(CHUNKING_PROFILES.keys())
+
+
+def get_profile_settings(profile_name: str, document_type: str) -> Dict[str, Any]:
+    """
+    Get the chunking settings for a document type within a profile.
+
+    Args:
+        profile_name: Name of the chunking profile
+        document_type: Type of document (e.g., 'textbook', 'lecture_notes')
+
+    Returns:
+        Dictionary with chunk_size, chunk_overlap and separators
+    """
+    if profile_name not in CHUNKING_PROFILES:
+        raise ValueError(f"Unknown chunking profile '{profile_name}'. Available: {', '.join(list_chunking_profiles())}")
+
+    profile = CHUNKING_PROFILES[profile_name]
+    return profile.get(document_type, profile["textbook"])
+
+
+def get_text_splitter(profile_name: str, document_type: str) -> RecursiveCharacterTextSplitter:
+    """
+    Create a token-measured text splitter for a document type.
+
+    Args:
+        profile_name: Name of the chunking profile
+        document_type: Type of document (e.g., 'textbook', 'lecture_notes')
+
+    Returns:
+        Configured text splitter
+    """
+    settings = get_profile_settings(profile_name, document_type)
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=settings["chunk_size"],
+        chunk_overlap=settings["chunk_overlap"],
+        length_function=count_tokens,
+        separators=_SEPARATOR_SETS[settings["separators"]],
+        is_separator_regex=True,
+        keep_separator=True
+    )
+
+
+def iter_merged_chunks(chunks: Iterable[Document], min_tokens: int = MIN_CHUNK_TOKENS) -> Iterator[Document]:
+    """
+    Merge tiny chunks (usually lone headings) into the following chunk of the same page, lazily.
+
+    Args:
+        chunks: Chunks in document order (may be a one-pass iterator)
+        min_tokens: Chunks with fewer tokens than this are merged forward
+
+    Yields:
+        Chunks, holding back at most one pending chunk
+    """
+    pending = None
+
+    for chunk in chunks:
+        if pending is not None:
+            same_page = (
+                pending.metadata.get("source") == chunk.metadata.get("source") and
+                pending.metadata.get("page") == chunk.metadata.get("page")
+            )
+            if same_page:
+                chunk.page_content = f"{pending.page_content}\n{chunk.page_content}"
+            else:
+                yield pending
+            pending = None
+
+        if count_tokens(chunk.page_content) < min_tokens:
+            pending = chunk
+        else:
+            yield chunk
+
+    if pending is not None:
+        yield pending
+
@@ -0,0 +1,66 @@
+import os
+import json
+import time
+from typing import Dict, Any, Optional
+
+from storage import get_data_dir, get_collection_name
+
+
+def get_manifest_path(class_name: str, manifest_directory: Optional[str] = None) -> str:
+    """Get the path to a class manifest file."""
+    directory = manifest_directory or get_data_dir("class_manifests")
+    return os.path.join(directory, f"{get_collection_name(class_name)}.json")
+
+
+def load_class_manifest(class_name: str, manifest_directory: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load the manifest describing how a class was built.
+
+    Args:
+        class_name: Name of the class
+        manifest_directory: Directory containing manifests (optional)
+
+    Returns:
+        Manifest dictionary, or an empty dictionary if none exists
+    """
+    path = get_manifest_path(class_name, manifest_directory)
+
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading manifest for class '{class_name}': {e}")
+        return {}
+
+
+def save_class_manifest(
+    class_name: str,
+    manifest: Dict[str, Any],
+    manifest_directory: Optional[str] = None
+) -> None:
+    """
+    Save the manifest for a class.
+
+    Args:
+        class_name: Name of the class
+        manifest: Manifest dictionary (e.g., source files and their hashes)
+        manifest_directory: Directory containing manifests (optional)
+    """
+    path = get_manifest_path(class_name, manifest_directory)
+    manifest = dict(manifest, class_name=class_name, updated_at=time.time())
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def delete_class_manifest(class_name: str, manifest_directory: Optional[str] = None) -> None:
+    """Delete the manifest for a class if it exists."""
+    path = get_manifest_path(class_name, manifest_directory)
+
+    if os.path.exists(path):
+        os.remove(path)
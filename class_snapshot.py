@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import argparse
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from langchain_chroma import Chroma
+
+from storage import get_collection_name
+from class_manifest import load_class_manifest, save_class_manifest
+from faq_cache import FAQCache, get_faq_path, delete_faq_cache
+from page_cache import PageTextCache
+from embedding_providers import LEGACY_EMBEDDING_CONFIG, get_class_embedding_config, get_embeddings
+from collection_staging import open_staging_collection, promote_staging_collection, discard_staging_collection
+
+# Bump when the bundle layout changes
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Rows read from or written to Chroma per call
+SNAPSHOT_BATCH_SIZE = 2000
+
+# Bundle layout: vectors as one float32 .npy array, row-aligned with
+# records.jsonl (id, text, metadata), plus the class manifest, FAQ answers
+# and cached page text so the class can still be re-chunked after import.
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.jsonl"
+FAQ_FILE = "faq.json"
+PAGES_PREFIX = "page_cache/"
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot can't be exported or imported."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def export_class_snapshot(
+    vector_store_manager: Any,
+    class_name: str,
+    output_path: str,
+    include_pages: bool = True
+) -> Dict[str, Any]:
+    """
+    Export a class's vectors, chunk text, metadata and manifest to a snapshot bundle.
+
+    Args:
+        vector_store_manager: VectorStoreManager holding the class
+        class_name: Name of the class
+        output_path: Path of the .zip bundle to write
+        include_pages: Whether to include cached page text for rebuilding
+
+    Returns:
+        Snapshot manifest describing the bundle
+    """
+    vector_store = vector_store_manager.get_vector_store(class_name)
+    if vector_store is None:
+        raise SnapshotError(f"Class '{class_name}' not found", 404)
+
+    collection = vector_store._collection
+    count = collection.count()
+    if count == 0:
+        raise SnapshotError(f"Class '{class_name}' has no documents", 404)
+
+    class_manifest = load_class_manifest(class_name)
+    embedding_config = get_class_embedding_config(class_name)
+    tmp_path = f"{output_path}.tmp"
+
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        embedding_batches = []
+        with bundle.open(RECORDS_FILE, "w", force_zip64=True) as records:
+            for offset in range(0, count, SNAPSHOT_BATCH_SIZE):
+                batch = collection.get(
+                    include=["embeddings", "documents", "metadatas"],
+                    limit=SNAPSHOT_BATCH_SIZE,
+                    offset=offset
+                )
+                embedding_batches.append(np.asarray(batch["embeddings"], dtype=np.float32))
+                for record_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                    # Chroma rejects empty metadata dicts, so chunks without metadata are written as null
+                    line = json.dumps({"id": record_id, "text": text, "metadata": metadata or None})
+                    records.write(line.encode("utf-8") + b"\n")
+
+        # Vectors barely compress, so they are stored as-is
+        embeddings = np.concatenate(embedding_batches)
+        info = zipfile.ZipInfo(EMBEDDINGS_FILE, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        with bundle.open(info, "w", force_zip64=True) as f:
+            np.save(f, embeddings, allow_pickle=False)
+
+        faq_path = get_faq_path(class_name)
+        if os.path.exists(faq_path):
+            bundle.write(faq_path, FAQ_FILE)
+
+        pages_included = 0
+        if include_pages:
+            page_cache = PageTextCache()
+            for source in class_manifest.get("sources", []):
+                cache_path = page_cache.get_cache_path(source["file_hash"])
+                if os.path.exists(cache_path):
+                    bundle.write(cache_path, PAGES_PREFIX + os.path.basename(cache_path), compress_type=zipfile.ZIP_STORED)
+                    pages_included += 1
+
+        snapshot_manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "class_name": class_name,
+            "collection_name": get_collection_name(class_name),
+            "count": int(embeddings.shape[0]),
+            "dimensions": int(embeddings.shape[1]),
+            "embedding_provider": embedding_config["provider"],
+            "embedding_model": embedding_config["model"],
+            "created_at": time.time(),
+            "page_cache_files": pages_included,
+            "class_manifest": class_manifest
+        }
+        bundle.writestr(MANIFEST_FILE, json.dumps(snapshot_manifest, indent=2))
+
+    os.replace(tmp_path, output_path)
+
+    print(f"Exported {snapshot_manifest['count']} chunks for class '{class_name}' to {output_path}")
+    return snapshot_manifest
+
+
+def read_snapshot_manifest(snapshot_path: str) -> Dict[str, Any]:
+    """Read the manifest of a snapshot bundle without loading its data."""
+    try:
+        with zipfile.ZipFile(snapshot_path, "r") as bundle:
+            return json.loads(bundle.read(MANIFEST_FILE))
+    except (zipfile.BadZipFile, KeyError, ValueError) as e:
+        raise SnapshotError(f"Not a valid class snapshot: {e}")
+
+
+def _load_bundle(
+    snapshot_path: str,
+    collection: Any,
+    snapshot_manifest: Dict[str, Any],
+    class_name: str
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """Bulk-add a bundle's vectors to a collection and restore its page cache files."""
+    source_class_name = snapshot_manifest["class_name"]
+
+    with zipfile.ZipFile(snapshot_path, "r") as bundle:
+        with bundle.open(EMBEDDINGS_FILE) as f:
+            embeddings = np.load(f, allow_pickle=False)
+
+        if embeddings.shape[0] != snapshot_manifest["count"]:
+            raise SnapshotError("Snapshot is corrupt: vector count doesn't match the manifest")
+
+        # Precomputed vectors are added in row order, so no embedding calls are made
+        row = 0
+        batch: List[Dict[str, Any]] = []
+
+        def flush() -> None:
+            nonlocal row
+            collection.add(
+                ids=[record["id"] for record in batch],
+                embeddings=embeddings[row:row + len(batch)],
+                documents=[record["text"] for record in batch],
+                metadatas=[record["metadata"] for record in batch]
+            )
+            row += len(batch)
+            batch.clear()
+
+        with bundle.open(RECORDS_FILE) as records:
+            for line in records:
+                record = json.loads(line)
+                # Older snapshots wrote {} for chunks without metadata
+                record["metadata"] = record.get("metadata") or None
+                if class_name != source_class_name and record["metadata"] and "class_name" in record["metadata"]:
+                    record["metadata"]["class_name"] = class_name
+                batch.append(record)
+                if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                    flush()
+        if batch:
+            flush()
+
+        if row != embeddings.shape[0]:
+            raise SnapshotError("Snapshot is corrupt: record count doesn't match the vectors")
+
+        # Restore cached page text so the class can be rebuilt later
+        page_cache = PageTextCache()
+        for name in bundle.namelist():
+            if name.startswith(PAGES_PREFIX) and name != PAGES_PREFIX:
+                # Cache files are sharded by the first two characters of the file hash
+                file_name = os.path.basename(name)
+                target_path = os.path.join(page_cache.cache_directory, file_name[:2], file_name)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                if not os.path.exists(target_path):
+                    with bundle.open(name) as source, open(f"{target_path}.tmp", "wb") as target:
+                        shutil.copyfileobj(source, target)
+                    os.replace(f"{target_path}.tmp", target_path)
+
+        faq_entries = []
+        if FAQ_FILE in bundle.namelist():
+            faq_entries = json.loads(bundle.read(FAQ_FILE)).get("entries", [])
+
+    return row, faq_entries
+
+
+def import_class_snapshot(
+    vector_store_manager: Any,
+    snapshot_path: str,
+    class_name: Optional[str] = None,
+    overwrite: bool = False
+) -> Dict[str, Any]:
+    """
+    Load a snapshot bundle straight into a class collection without calling the embedding API.
+
+    Args:
+        vector_store_manager: VectorStoreManager to load the class into
+        snapshot_path: Path of the .zip bundle
+        class_name: Name to import the class as (optional, defaults to the exported name)
+        overwrite: Whether to replace an existing class with the same name
+
+    Returns:
+        Summary of the import
+    """
+    start_time = time.monotonic()
+    snapshot_manifest = read_snapshot_manifest(snapshot_path)
+
+    if snapshot_manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format version {snapshot_manifest.get('format_version')}")
+
+    # Queries against the class must use the model its vectors were made with
+    embedding_config = {
+        "provider": snapshot_manifest.get("embedding_provider") or LEGACY_EMBEDDING_CONFIG["provider"],
+        "model": snapshot_manifest.get("embedding_model") or LEGACY_EMBEDDING_CONFIG["model"]
+    }
+    try:
+        embeddings = get_embeddings(embedding_config, vector_store_manager.openai_api_key)
+    except Exception as e:
+        raise SnapshotError(
+            f"Snapshot was embedded with {embedding_config['provider']} model "
+            f"'{embedding_config['model']}', which this server can't load: {e}"
+        )
+
+    source_class_name = snapshot_manifest["class_name"]
+    class_name = class_name or source_class_name
+    collection_name = get_collection_name(class_name)
+    collection_path = vector_store_manager.get_collection_path(class_name)
+
+    # An existing class is replaced only once the whole bundle has loaded
+    staged = vector_store_manager.get_class_info(class_name).get("exists", False)
+    if staged and not overwrite:
+        raise SnapshotError(f"Class '{class_name}' already exists", 409)
+
+    os.makedirs(collection_path, exist_ok=True)
+    if staged:
+        vector_store = open_staging_collection(collection_path, collection_name, embeddings)
+    else:
+        vector_store = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=collection_path
+        )
+    collection = vector_store._collection
+
+    try:
+        row, faq_entries = _load_bundle(snapshot_path, collection, snapshot_manifest, class_name)
+        if staged:
+            promote_staging_collection(collection_path, collection_name)
+    except Exception:
+        # Don't leave a half-loaded class behind; a replaced class keeps its old chunks
+        if staged:
+            discard_staging_collection(collection_path, collection_name)
+        else:
+            vector_store.delete_collection()
+        raise
+
+    if faq_entries:
+        FAQCache().save_entries(class_name, faq_entries)
+    else:
+        delete_faq_cache(class_name)
+
+    class_manifest = dict(snapshot_manifest.get("class_manifest") or {})
+    class_manifest["embedding"] = embedding_config
+    class_manifest["imported_from"] = {
+        "class_name": source_class_name,
+        "created_at": snapshot_manifest.get("created_at"),
+        "imported_at": time.time()
+    }
+    save_class_manifest(class_name, class_manifest)
+
+    elapsed = time.monotonic() - start_time
+    print(f"Imported {row} chunks into class '{class_name}' in {elapsed:.2f}s")
+
+    return {
+        "class_name": class_name,
+        "chunks": row,
+        "faq_entries": len(faq_entries),
+        "elapsed_seconds": round(elapsed, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a class snapshot.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export a class to a snapshot bundle")
+    export_parser.add_argument("class_name", help="Name of the class")
+    export_parser.add_argument("-o", "--output", help="Output .zip path (defaults to <class>.snapshot.zip)")
+    export_parser.add_argument("--no-pages", action="store_true", help="Leave out cached page text")
+
+    import_parser = subparsers.add_parser("import", help="Import a class from a snapshot bundle")
+    import_parser.add_argument("snapshot", help="Path of the .zip bundle")
+    import_parser.add_argument("--class-name", help="Import under a different class name")
+    import_parser.add_argument("--overwrite", action="store_true", help="Replace an existing class")
+
+    args = parser.parse_args()
+
+    from vector_store import VectorStoreManager
+    vector_store_manager = VectorStoreManager()
+
+    try:
+        if args.command == "export":
+            output_path = args.output or f"{get_collection_name(args.class_name)}.snapshot.zip"
+            result = export_class_snapshot(
+                vector_store_manager, args.class_name, output_path, include_pages=not args.no_pages
+            )
+            result.pop("class_manifest", None)
+        else:
+            result = import_class_snapshot(
+                vector_store_manager, args.snapshot, class_name=args.class_name, overwrite=args.overwrite
+            )
+    except SnapshotError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from typing import Any, Optional
+from langchain_chroma import Chroma
+
+# Replacement collections are built next to the live one, in the same persist directory
+STAGING_SUFFIX = "__staging"
+
+# Attempts to take over the live name if a reader recreates it mid-swap
+_PROMOTE_ATTEMPTS = 3
+
+
+def get_staging_collection_name(collection_name: str) -> str:
+    """Get the name a replacement for a collection is built under."""
+    return f"{collection_name}{STAGING_SUFFIX}"
+
+
+def _delete_collection(client: Any, name: str) -> None:
+    try:
+        client.delete_collection(name)
+    except Exception:
+        # Already gone
+        pass
+
+
+def open_staging_collection(
+    collection_path: str,
+    collection_name: str,
+    embedding_function: Optional[Any] = None
+) -> Chroma:
+    """
+    Create an empty collection to build a replacement for a live collection in.
+
+    Queries keep using the live collection until the replacement is promoted,
+    so a failed rebuild or import leaves the class as it was. Anything left
+    from an earlier interrupted attempt is discarded first.
+
+    Args:
+        collection_path: Persist directory of the live collection
+        collection_name: Name of the live collection
+        embedding_function: Embeddings for the staging vector store (optional)
+
+    Returns:
+        Chroma vector store for the staging collection
+    """
+    staging_name = get_staging_collection_name(collection_name)
+    vector_store = Chroma(
+        collection_name=staging_name,
+        embedding_function=embedding_function,
+        persist_directory=collection_path
+    )
+    if vector_store._collection.count() > 0:
+        vector_store.delete_collection()
+        vector_store = Chroma(
+            collection_name=staging_name,
+            embedding_function=embedding_function,
+            persist_directory=collection_path
+        )
+    return vector_store
+
+
+def discard_staging_collection(collection_path: str, collection_name: str) -> None:
+    """Delete a staging collection after a failed build; the live collection is untouched."""
+    try:
+        Chroma(
+            collection_name=get_staging_collection_name(collection_name),
+            persist_directory=collection_path
+        ).delete_collection()
+    except Exception as e:
+        print(f"Error removing staging collection for '{collection_name}': {e}")
+
+
+def promote_staging_collection(collection_path: str, collection_name: str) -> None:
+    """
+    Replace a live collection with its fully built staging collection.
+
+    The old collection is deleted and the staging collection renamed in its
+    place, so readers see either the old or the new chunks, apart from a
+    moment where the class has no collection.
+
+    Args:
+        collection_path: Persist directory of the live collection
+        collection_name: Name of the live collection
+    """
+    staging_store = Chroma(
+        collection_name=get_staging_collection_name(collection_name),
+        persist_directory=collection_path
+    )
+    staging, client = staging_store._collection, staging_store._client
+
+    for attempt in range(_PROMOTE_ATTEMPTS):
+        _delete_collection(client, collection_name)
+        try:
+            staging.modify(name=collection_name)
+            return
+        except Exception:
+            # A concurrent request opened the class between the delete and the rename,
+            # which recreates an empty collection under the live name
+            if attempt == _PROMOTE_ATTEMPTS - 1:
+                raise
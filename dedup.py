@@ -0,0 +1,263 @@
+import re
+import hashlib
+from collections import Counter, defaultdict
+from typing import Iterable, List, Dict, Optional, Set, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+# Metadata key on a kept chunk listing the other pages it also appears on.
+# Chroma only accepts scalar metadata, so references are stored as a
+# "filename:page; filename:page" string.
+DUPLICATE_SOURCES_KEY = "duplicate_sources"
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WHITESPACE_RE = re.compile(r"\s+")
+_DIGITS_RE = re.compile(r"\d+")
+_MAX_NUMBERED_LINE_WORDS = 4
+
+
+def _normalize_text(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def _normalize_line(line: str) -> str:
+    text = _normalize_text(line)
+    # Page numbers and dates change from page to page, so ignore digits in
+    # short lines such as "Lecture 3 - Page 12"
+    if len(text.split(" ")) <= _MAX_NUMBERED_LINE_WORDS:
+        return _DIGITS_RE.sub("#", text)
+    return text
+
+
+def format_source_ref(metadata: Dict) -> str:
+    """Format a chunk's filename and page as a back-reference string."""
+    return f"{metadata.get('filename', 'Unknown')}:{metadata.get('page', 'Unknown')}"
+
+
+def parse_source_refs(value: Optional[str]) -> List[Dict[str, str]]:
+    """
+    Parse a back-reference string written by the deduplicator.
+
+    Args:
+        value: Value of the duplicate_sources metadata field
+
+    Returns:
+        List of dictionaries with filename and page
+    """
+    refs = []
+    for ref in (value or "").split(";"):
+        ref = ref.strip()
+        if not ref:
+            continue
+        filename, _, page = ref.rpartition(":")
+        refs.append({"filename": filename or ref, "page": page})
+    return refs
+
+
+def find_boilerplate(
+    pages: Iterable[Document],
+    min_pages: int = 3,
+    min_fraction: float = 0.5
+) -> Set[str]:
+    """
+    Find normalized lines that repeat across most pages of a single document.
+
+    Args:
+        pages: Page documents of one source file (may be a one-pass iterator)
+        min_pages: Minimum number of pages a source needs before stripping
+        min_fraction: Fraction of pages a line must appear on to be stripped
+
+    Returns:
+        Set of normalized boilerplate lines
+    """
+    # Count each line at most once per page
+    line_counts = Counter()
+    page_count = 0
+    for page in pages:
+        line_counts.update({
+            _normalize_line(line) for line in page.page_content.splitlines() if line.strip()
+        })
+        page_count += 1
+
+    if page_count < min_pages:
+        return set()
+
+    threshold = max(2, int(page_count * min_fraction))
+    return {line for line, count in line_counts.items() if count >= threshold}
+
+
+def remove_boilerplate(page: Document, boilerplate: Set[str]) -> Document:
+    """Remove boilerplate lines (see find_boilerplate) from a page in place."""
+    if boilerplate:
+        page.page_content = "\n".join(
+            line for line in page.page_content.splitlines()
+            if _normalize_line(line) not in boilerplate
+        )
+    return page
+
+
+class ChunkDeduplicator:
+    def __init__(
+        self,
+        num_permutations: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3,
+        similarity_threshold: float = 0.8,
+        seed: int = 42
+    ):
+        """
+        Initialize a MinHash/LSH near-duplicate detector for chunks.
+
+        Args:
+            num_permutations: Number of MinHash permutations per chunk
+            bands: Number of LSH bands (must divide num_permutations)
+            shingle_size: Number of words per shingle
+            similarity_threshold: Estimated Jaccard similarity above which chunks are duplicates
+            seed: Random seed for the permutations
+        """
+        if num_permutations % bands != 0:
+            raise ValueError("num_permutations must be divisible by bands")
+
+        self.num_permutations = num_permutations
+        self.bands = bands
+        self.rows = num_permutations // bands
+        self.shingle_size = shingle_size
+        self.similarity_threshold = similarity_threshold
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all previously seen chunks."""
+        self._exact: Dict[str, int] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        self._signatures: List[np.ndarray] = []
+        # Only metadata is kept, so chunk text can be freed once it has been stored
+        self._kept: List[Dict] = []
+        self._updated: Set[int] = set()
+        self.duplicates_removed = 0
+
+    def _signature(self, text: str) -> Optional[np.ndarray]:
+        words = text.split(" ")
+        if len(words) < self.shingle_size:
+            shingles = {text}
+        else:
+            shingles = {
+                " ".join(words[i:i + self.shingle_size])
+                for i in range(len(words) - self.shingle_size + 1)
+            }
+
+        if not shingles:
+            return None
+
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") % _MERSENNE_PRIME
+             for s in shingles],
+            dtype=np.uint64
+        )
+
+        # a, b and hashes are all below 2^31, so the products fit in 64 bits
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def _merge_into(self, index: int, duplicate: Document) -> None:
+        kept = self._kept[index]
+        ref = format_source_ref(duplicate.metadata)
+        if ref == format_source_ref(kept):
+            return
+
+        existing = kept.get(DUPLICATE_SOURCES_KEY, "")
+        refs = [r.strip() for r in existing.split(";") if r.strip()]
+        # Carry over references the duplicate had collected itself
+        refs_to_add = [ref] + [
+            r.strip() for r in duplicate.metadata.get(DUPLICATE_SOURCES_KEY, "").split(";") if r.strip()
+        ]
+        for r in refs_to_add:
+            if r not in refs:
+                refs.append(r)
+
+        value = "; ".join(refs)
+        if value != existing:
+            kept[DUPLICATE_SOURCES_KEY] = value
+            self._updated.add(index)
+
+    def add(self, document: Document) -> Optional[Document]:
+        """
+        Add a chunk, merging it into an earlier chunk if it is a near-duplicate.
+
+        Args:
+            document: Chunk to add
+
+        Returns:
+            The chunk if it was kept, or None if it was merged into an earlier one
+        """
+        text = _normalize_text(document.page_content)
+
+        # Chunks left empty after boilerplate stripping carry no information
+        if not text:
+            self.duplicates_removed += 1
+            return None
+
+        exact_key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if exact_key in self._exact:
+            self._merge_into(self._exact[exact_key], document)
+            self.duplicates_removed += 1
+            return None
+
+        signature = self._signature(text)
+        band_keys = [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+        # Check LSH candidates against the similarity threshold
+        candidates = {index for key in band_keys for index in self._buckets.get(key, [])}
+        for index in sorted(candidates):
+            similarity = float(np.mean(self._signatures[index] == signature))
+            if similarity >= self.similarity_threshold:
+                self._merge_into(index, document)
+                self.duplicates_removed += 1
+                return None
+
+        index = len(self._kept)
+        self._kept.append(document.metadata)
+        self._signatures.append(signature)
+        self._exact[exact_key] = index
+        for key in band_keys:
+            self._buckets[key].append(index)
+
+        return document
+
+    @property
+    def kept_count(self) -> int:
+        """Number of chunks kept so far; kept chunks are numbered from 0 in the order added."""
+        return len(self._kept)
+
+    def pop_updated(self) -> List[Tuple[int, str]]:
+        """
+        Get back-references added to chunks after they were kept.
+
+        When chunks are stored as they are kept, the store has to be updated
+        with references from duplicates that arrived later.
+
+        Returns:
+            List of (kept chunk number, duplicate_sources value) pairs since the last call
+        """
+        updated = [(index, self._kept[index][DUPLICATE_SOURCES_KEY]) for index in sorted(self._updated)]
+        self._updated.clear()
+        return updated
+
+    def deduplicate(self, documents: List[Document]) -> List[Document]:
+        """
+        Remove near-duplicate chunks, keeping the first occurrence of each.
+
+        Args:
+            documents: List of chunked LangChain Document objects
+
+        Returns:
+            List of unique chunks with back-references to merged duplicates
+        """
+        return [doc for doc in documents if self.add(doc) is not None]
@@ -1,229 +1,385 @@
 import os
-from typing import List, Any, Optional
+import glob
+import itertools
+from typing import List, Dict, Iterable, Iterator, Optional
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
 from langchain_chroma import Chroma
+from dedup import ChunkDeduplicator, find_boilerplate, remove_boilerplate
+from page_cache import PageTextCache
+from class_manifest import load_class_manifest, save_class_manifest
+from storage import get_collection_name
+from embedding_providers import (
+    resolve_embedding_config, get_class_embedding_config, get_embeddings
+)
+from chunking import DEFAULT_CHUNKING_PROFILE, get_text_splitter, get_profile_settings, iter_merged_chunks
+from ingest_pipeline import StreamingIngestor
+from collection_staging import open_staging_collection, promote_staging_collection, discard_staging_collection
 
 # Load environment variables
 load_dotenv()
 
 class DocumentProcessor:
-    def __init__(self, openai_api_key: Optional[str] = None):
+    def __init__(
+        self,
+        openai_api_key: Optional[str] = None,
+        deduplicate: bool = True,
+        page_cache: Optional[PageTextCache] = None,
+        chunking_profile: str = DEFAULT_CHUNKING_PROFILE
+    ):
         """
         Initialize the document processor with Railway volume support.
         
         Args:
-            openai_api_key: OpenAI API key for embeddings (optional)
+            openai_api_key: OpenAI API key for OpenAI embeddings (optional)
+            deduplicate: Whether to strip boilerplate and drop near-duplicate chunks
+            page_cache: Cache of extracted PDF page text (optional)
+            chunking_profile: Default chunking profile name (see chunking.py)
         """
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        self.deduplicate = deduplicate
+        self.page_cache = page_cache or PageTextCache()
         
-        # Initialize OpenAI embeddings
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=self.openai_api_key,
-            model="text-embedding-3-small"
-        )
+        # Embeddings for new classes; chunks added to an existing class use the provider it was built with
+        self.embedding_config = resolve_embedding_config()
+        self.embeddings = get_embeddings(self.embedding_config, self.openai_api_key)
+        
+        # Validate the default chunking profile
+        get_profile_settings(chunking_profile, "textbook")
+        self.chunking_profile = chunking_profile
+    
+    def _iter_file_chunks(
+        self,
+        file_hash: str,
+        source: str,
+        filename: str,
+        class_name: str,
+        document_type: str,
+        chunking_profile: Optional[str] = None
+    ) -> Iterator[Document]:
+        """Chunk one file's cached pages a page at a time, never crossing page boundaries."""
+        # Remove headers and footers repeated on every page, found in a first pass over the cache
+        boilerplate = set()
+        if self.deduplicate:
+            boilerplate = find_boilerplate(self.page_cache.iter_pages(file_hash, source=source))
+        
+        text_splitter = get_text_splitter(chunking_profile or self.chunking_profile, document_type)
+        
+        def split_pages() -> Iterator[Document]:
+            for page in self.page_cache.iter_pages(file_hash, source=source):
+                page.metadata.update({
+                    "filename": filename,
+                    "class_name": class_name,
+                    "document_type": document_type
+                })
+                yield from text_splitter.split_documents([remove_boilerplate(page, boilerplate)])
         
-        # Initialize text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
+        # Keep headings attached to the section that follows them
+        yield from iter_merged_chunks(split_pages())
+    
+    def _iter_pdf_chunks(
+        self,
+        pdf_path: str,
+        class_name: str,
+        document_type: str,
+        chunking_profile: Optional[str] = None
+    ) -> Iterator[Document]:
+        """Extract a PDF into the page cache (if needed) and chunk it lazily."""
+        file_hash = self.page_cache.ensure_cached(pdf_path)
+        yield from self._iter_file_chunks(
+            file_hash, pdf_path, os.path.basename(pdf_path), class_name, document_type, chunking_profile
         )
     
-    def process_pdf(self, pdf_path: str, class_name: str, document_type: str) -> List[Document]:
+    def _list_pdfs(self, directory: str) -> List[str]:
+        return sorted(glob.glob(os.path.join(directory, "**", "*.pdf"), recursive=True))
+    
+    def iter_class_chunks(
+        self,
+        class_name: str,
+        textbook_path: Optional[str] = None,
+        lecture_notes_dir: Optional[str] = None,
+        assignments_dir: Optional[str] = None,
+        chunking_profile: Optional[str] = None
+    ) -> Iterator[Document]:
         """
-        Process a single PDF file and return chunked documents with metadata.
+        Lazily chunk all materials for a class, one page at a time.
+        
+        Files that can't be read are skipped.
         
         Args:
-            pdf_path: Path to the PDF file
             class_name: Name of the class
-            document_type: Type of document (e.g., 'textbook', 'lecture_notes')
+            textbook_path: Path to the textbook PDF (optional)
+            lecture_notes_dir: Directory containing lecture notes PDFs (optional)
+            assignments_dir: Directory containing assignment PDFs (optional)
+            chunking_profile: Chunking profile name (optional, defaults to the processor's)
             
-        Returns:
-            List of LangChain Document objects
+        Yields:
+            Chunked LangChain Document objects
         """
-        try:
+        pdf_files = []
+        if textbook_path and os.path.isfile(textbook_path) and textbook_path.lower().endswith('.pdf'):
+            pdf_files.append((textbook_path, "textbook"))
+        
+        for directory, document_type in ((lecture_notes_dir, "lecture_notes"), (assignments_dir, "assignments")):
+            if directory and os.path.isdir(directory):
+                pdf_files.extend((pdf_path, document_type) for pdf_path in self._list_pdfs(directory))
+        
+        for pdf_path, document_type in pdf_files:
             print(f"Processing {pdf_path}...")
-            
-            # Load PDF
-            loader = PyPDFLoader(pdf_path)
-            documents = loader.load()
-            
-            if not documents:
-                print(f"No content extracted from {pdf_path}")
-                return []
-            
-            # Add metadata to documents
-            filename = os.path.basename(pdf_path)
-            
-            for doc in documents:
-                doc.metadata.update({
-                    "source": pdf_path,
-                    "filename": filename,
-                    "class_name": class_name,
-                    "document_type": document_type
-                })
-            
-            # Split documents into chunks
-            chunked_documents = self.text_splitter.split_documents(documents)
-            print(f"Created {len(chunked_documents)} chunks from {pdf_path}")
-            
-            return chunked_documents
-            
-        except Exception as e:
-            print(f"Error processing {pdf_path}: {e}")
-            return []
+            try:
+                yield from self._iter_pdf_chunks(pdf_path, class_name, document_type, chunking_profile)
+            except Exception as e:
+                print(f"Error processing {pdf_path}: {e}")
     
-    def process_directory(self, directory: str, class_name: str, document_type: str) -> List[Document]:
+    def get_collection_path(self, class_name: str) -> str:
+        """Get the path to a collection directory."""
+        # Check for Railway volume mount path
+        railway_volume_path = os.environ.get("RAILWAY_VOLUME_MOUNT_PATH")
+        
+        if railway_volume_path and os.path.exists(railway_volume_path):
+            # Use Railway volume for persistence
+            base_persist_directory = os.path.join(railway_volume_path, "chroma_db")
+        else:
+            # Fallback to local directory
+            base_persist_directory = "chroma_db"
+        
+        return os.path.join(base_persist_directory, get_collection_name(class_name))
+    
+    def process_class_materials(
+        self, 
+        class_name: str, 
+        textbook_path: Optional[str] = None,
+        lecture_notes_dir: Optional[str] = None,
+        assignments_dir: Optional[str] = None,
+        chunking_profile: Optional[str] = None
+    ) -> bool:
         """
-        Process all PDF files in a directory and return chunked documents.
+        Process all materials for a class and create a vector store.
+        
+        Materials are streamed through chunking, embedding and storage, so
+        memory use doesn't grow with the size of the course.
         
         Args:
-            directory: Directory containing PDF files
             class_name: Name of the class
-            document_type: Type of documents in the directory
+            textbook_path: Path to the textbook PDF (optional)
+            lecture_notes_dir: Directory containing lecture notes PDFs (optional)
+            assignments_dir: Directory containing assignment PDFs (optional)
+            chunking_profile: Chunking profile name (optional, defaults to the processor's)
             
         Returns:
-            List of LangChain Document objects
+            True if successful, False otherwise
         """
-        try:
-            print(f"Processing directory {directory}...")
-            
-            # Create directory loader for PDF files
-            loader = DirectoryLoader(
-                directory,
-                glob="**/*.pdf",
-                loader_cls=PyPDFLoader
-            )
-            
-            # Load documents
-            documents = loader.load()
-            
-            if not documents:
-                print(f"No documents found in {directory}")
-                return []
-            
-            # Add metadata to documents
+        chunking_profile = chunking_profile or self.chunking_profile
+        chunks = self.iter_class_chunks(
+            class_name,
+            textbook_path=textbook_path,
+            lecture_notes_dir=lecture_notes_dir,
+            assignments_dir=assignments_dir,
+            chunking_profile=chunking_profile
+        )
+        
+        return self._build_class(class_name, chunks, chunking_profile)
+    
+    def _build_class(
+        self,
+        class_name: str,
+        chunks: Iterable[Document],
+        chunking_profile: str,
+        embedding_config: Optional[Dict[str, str]] = None,
+        replace: bool = False
+    ) -> bool:
+        """
+        Deduplicate and stream chunks into the vector store, then record the class manifest.
+        
+        New chunks are added to an existing class unless replace is set, in which
+        case they are built into a staging collection that only takes the place
+        of the class's chunks once ingestion has succeeded.
+        """
+        chunks = iter(chunks)
+        first_chunk = next(chunks, None)
+        
+        if first_chunk is None:
+            print("No documents were processed successfully")
+            return False
+        
+        # Record the source files so the class can be rebuilt from the page cache
+        sources: Dict[str, Dict[str, str]] = {}
+        
+        def track_sources(documents: Iterable[Document]) -> Iterator[Document]:
             for doc in documents:
-                filename = os.path.basename(doc.metadata.get("source", "unknown"))
-                doc.metadata.update({
-                    "filename": filename,
-                    "class_name": class_name,
-                    "document_type": document_type
-                })
+                file_hash = doc.metadata.get("file_hash")
+                if file_hash and file_hash not in sources:
+                    sources[file_hash] = {
+                        "file_hash": file_hash,
+                        "filename": doc.metadata.get("filename", "unknown"),
+                        "document_type": doc.metadata.get("document_type", "unknown")
+                    }
+                yield doc
+        
+        # Drop near-duplicate chunks across all materials, keeping back-references
+        deduplicator = ChunkDeduplicator() if self.deduplicate else None
+        
+        collection_name = get_collection_name(class_name)
+        collection_path = self.get_collection_path(class_name)
+        is_new_class = not os.path.exists(collection_path)
+        staged = replace and not is_new_class
+        vector_store = None
+        
+        try:
+            os.makedirs(collection_path, exist_ok=True)
+            if staged:
+                vector_store = open_staging_collection(collection_path, collection_name)
+            else:
+                vector_store = Chroma(
+                    collection_name=collection_name,
+                    persist_directory=collection_path
+                )
             
-            # Split documents into chunks
-            chunked_documents = self.text_splitter.split_documents(documents)
-            print(f"Created {len(chunked_documents)} chunks from {directory}")
+            # Chunks added to a class that already has some must match its index
+            if embedding_config is None:
+                if vector_store._collection.count() > 0:
+                    embedding_config = get_class_embedding_config(class_name)
+                else:
+                    embedding_config = self.embedding_config
+            embeddings = get_embeddings(embedding_config, self.openai_api_key)
             
-            return chunked_documents
+            stats = StreamingIngestor(embeddings).ingest(
+                track_sources(itertools.chain([first_chunk], chunks)),
+                vector_store._collection,
+                deduplicator
+            )
             
+            if staged:
+                promote_staging_collection(collection_path, collection_name)
         except Exception as e:
-            print(f"Error processing directory {directory}: {e}")
-            return []
+            print(f"Error creating vector store: {e}")
+            # Don't leave an empty class behind; a replaced class keeps its old chunks
+            if staged:
+                discard_staging_collection(collection_path, collection_name)
+            elif is_new_class and vector_store is not None:
+                vector_store.delete_collection()
+            return False
+        
+        if deduplicator is not None:
+            print(f"Removed {deduplicator.duplicates_removed} near-duplicate chunks")
+        print(
+            f"Created vector store for class '{class_name}' at {collection_path} "
+            f"with {stats['chunks']} documents in {stats['elapsed_seconds']}s"
+        )
+        
+        manifest = load_class_manifest(class_name)
+        chunk_count = stats["chunks"]
+        
+        # Materials added to an existing class are recorded alongside the earlier ones
+        if not replace:
+            existing_sources = manifest.get("sources", [])
+            known_hashes = {source["file_hash"] for source in existing_sources}
+            sources_list = existing_sources + [s for h, s in sources.items() if h not in known_hashes]
+            chunk_count = vector_store._collection.count()
+        else:
+            sources_list = list(sources.values())
+        
+        manifest.update({
+            "sources": sources_list,
+            "chunking_profile": chunking_profile,
+            "chunk_count": chunk_count,
+            "embedding": {"provider": embedding_config["provider"], "model": embedding_config["model"]}
+        })
+        save_class_manifest(class_name, manifest)
+        
+        return True
     
-    def create_vector_store(self, documents: List[Document], class_name: str) -> Any:
+    def iter_cached_chunks(self, class_name: str, chunking_profile: Optional[str] = None) -> Optional[Iterator[Document]]:
         """
-        Create a vector store from documents.
+        Lazily chunk a class's materials from cached page text, without re-parsing PDFs.
         
         Args:
-            documents: List of LangChain Document objects
             class_name: Name of the class
+            chunking_profile: Chunking profile name (optional, defaults to the class's profile)
             
         Returns:
-            Chroma vector store or None if failed
+            Iterator of chunked documents, or None if the cache is unavailable
         """
-        if not documents:
-            print("No documents to create vector store from")
+        manifest = load_class_manifest(class_name)
+        sources = manifest.get("sources", [])
+        chunking_profile = chunking_profile or manifest.get("chunking_profile") or self.chunking_profile
+        
+        if not sources:
+            print(f"No source manifest found for class '{class_name}'")
             return None
         
-        try:
-            # Create a sanitized collection name
-            collection_name = class_name.replace(" ", "_").lower()
-            
-            # Check for Railway volume mount path
-            railway_volume_path = os.environ.get("RAILWAY_VOLUME_MOUNT_PATH")
-            
-            if railway_volume_path and os.path.exists(railway_volume_path):
-                # Use Railway volume for persistence
-                base_persist_directory = os.path.join(railway_volume_path, "chroma_db")
-                print(f"Using Railway volume for persistence at: {base_persist_directory}")
-            else:
-                # Fallback to local directory
-                base_persist_directory = "chroma_db"
-                print(f"Using local directory for persistence at: {base_persist_directory}")
-            
-            # Create full path for this collection
-            collection_path = os.path.join(base_persist_directory, collection_name)
-            os.makedirs(collection_path, exist_ok=True)
-            
-            # Create vector store
-            vector_store = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                persist_directory=collection_path,
-                collection_name=collection_name
-            )
-            
-            # Explicitly persist the vector store
-            try:
-                if hasattr(vector_store, 'persist'):
-                    vector_store.persist()
-                    print(f"Vector store persisted at {collection_path}")
-            except Exception as e:
-                print(f"Warning: Could not persist vector store, but it should still be usable: {e}")
-            
-            print(f"Created vector store for class '{class_name}' with {len(documents)} documents")
-            return vector_store
-            
-        except Exception as e:
-            print(f"Error creating vector store: {e}")
+        missing = [s["filename"] for s in sources if not self.page_cache.has_pages(s["file_hash"])]
+        if missing:
+            print(f"Page cache is missing for: {', '.join(missing)}")
             return None
+        
+        def iter_chunks() -> Iterator[Document]:
+            for source in sources:
+                yield from self._iter_file_chunks(
+                    source["file_hash"],
+                    source["filename"],
+                    source["filename"],
+                    class_name,
+                    source["document_type"],
+                    chunking_profile
+                )
+        
+        return iter_chunks()
     
-    def process_class_materials(
-        self, 
-        class_name: str, 
-        textbook_path: Optional[str] = None,
-        lecture_notes_dir: Optional[str] = None,
-        assignments_dir: Optional[str] = None
+    def load_cached_chunks(self, class_name: str, chunking_profile: Optional[str] = None) -> Optional[List[Document]]:
+        """
+        Chunk a class's materials from cached page text, without re-parsing PDFs.
+        
+        Args:
+            class_name: Name of the class
+            chunking_profile: Chunking profile name (optional, defaults to the class's profile)
+            
+        Returns:
+            List of chunked documents, or None if the cache is unavailable
+        """
+        chunks = self.iter_cached_chunks(class_name, chunking_profile)
+        return list(chunks) if chunks is not None else None
+    
+    def rebuild_class_from_cache(
+        self,
+        class_name: str,
+        chunking_profile: Optional[str] = None,
+        embedding_provider: Optional[str] = None,
+        embedding_model: Optional[str] = None
     ) -> bool:
         """
-        Process all materials for a class and create a vector store.
+        Re-chunk and re-embed a class from cached page text, without re-parsing PDFs.
         
         Args:
             class_name: Name of the class
-            textbook_path: Path to the textbook PDF (optional)
-            lecture_notes_dir: Directory containing lecture notes PDFs (optional)
-            assignments_dir: Directory containing assignment PDFs (optional)
+            chunking_profile: Chunking profile name (optional, defaults to the class's profile)
+            embedding_provider: Embedding provider to switch the class to (optional, defaults to the class's)
+            embedding_model: Embedding model to switch the class to (optional)
             
         Returns:
             True if successful, False otherwise
         """
-        all_documents = []
-        
-        # Process textbook if provided
-        if textbook_path and os.path.isfile(textbook_path) and textbook_path.lower().endswith('.pdf'):
-            textbook_docs = self.process_pdf(textbook_path, class_name, "textbook")
-            all_documents.extend(textbook_docs)
+        chunking_profile = (
+            chunking_profile or load_class_manifest(class_name).get("chunking_profile") or self.chunking_profile
+        )
         
-        # Process lecture notes if provided
-        if lecture_notes_dir and os.path.isdir(lecture_notes_dir):
-            lecture_docs = self.process_directory(lecture_notes_dir, class_name, "lecture_notes")
-            all_documents.extend(lecture_docs)
+        try:
+            if embedding_provider or embedding_model:
+                embedding_config = resolve_embedding_config(
+                    embedding_provider or get_class_embedding_config(class_name)["provider"],
+                    embedding_model
+                )
+            else:
+                embedding_config = get_class_embedding_config(class_name)
+            get_embeddings(embedding_config, self.openai_api_key)
+        except Exception as e:
+            print(f"Error loading embeddings for class '{class_name}': {e}")
+            return False
         
-        # Process assignments if provided
-        if assignments_dir and os.path.isdir(assignments_dir):
-            assignment_docs = self.process_directory(assignments_dir, class_name, "assignments")
-            all_documents.extend(assignment_docs)
+        chunks = self.iter_cached_chunks(class_name, chunking_profile)
         
-        if not all_documents:
-            print("No documents were processed successfully")
+        if chunks is None:
             return False
         
-        # Create vector store
-        vector_store = self.create_vector_store(all_documents, class_name)
-        
-        return vector_store is not None
\ No newline at end of file
+        # Replace the existing chunks rather than adding to them, keeping them if the rebuild fails
+        return self._build_class(class_name, chunks, chunking_profile, embedding_config, replace=True)
@@ -0,0 +1,165 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from storage import get_data_dir
+from class_manifest import load_class_manifest, save_class_manifest
+from resilient import ResilientEmbeddings
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_OPENAI_MODEL = "text-embedding-3-small"
+DEFAULT_LOCAL_MODEL = "all-MiniLM-L6-v2"
+
+# Provider and model used for new classes; existing classes keep the one they were built with
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
+
+# Inference threads and texts per batch for the local provider
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "2"))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+
+# Classes built before providers were recorded in the manifest all used OpenAI
+LEGACY_EMBEDDING_CONFIG = {"provider": "openai", "model": DEFAULT_OPENAI_MODEL}
+
+
+class LocalEmbeddings(Embeddings):
+    def __init__(
+        self,
+        model: str = DEFAULT_LOCAL_MODEL,
+        batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+        max_workers: int = LOCAL_EMBEDDING_WORKERS
+    ):
+        """
+        Initialize a CPU-only embedding model that runs in this process.
+
+        Uses the ONNX build of all-MiniLM-L6-v2 that ships with chromadb, so no
+        extra dependencies are needed. The model files are downloaded once to
+        the data volume on first use. Inference runs on a small thread pool so
+        concurrent requests share a fixed number of CPU threads.
+
+        Args:
+            model: Local model name
+            batch_size: Texts encoded per inference call
+            max_workers: Number of inference threads
+        """
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+        if model != ONNXMiniLM_L6_V2.MODEL_NAME:
+            raise ValueError(f"Unknown local embedding model '{model}'. Available: {ONNXMiniLM_L6_V2.MODEL_NAME}")
+
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self._encoder = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+        self._encoder.DOWNLOAD_PATH = os.path.join(get_data_dir("embedding_models"), model)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="local-embed")
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self._encoder(texts)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in batches spread over the inference threads, keeping their order."""
+        futures = [
+            self._executor.submit(self._encode, texts[offset:offset + self.batch_size])
+            for offset in range(0, len(texts), self.batch_size)
+        ]
+        return [vector for future in futures for vector in future.result()]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._executor.submit(self._encode, [text]).result()[0]
+
+
+def _create_openai_embeddings(model: str, openai_api_key: Optional[str]) -> Embeddings:
+    # Deadlines, retries and hedging are handled by the wrapper
+    return ResilientEmbeddings(OpenAIEmbeddings(
+        openai_api_key=openai_api_key or os.getenv("OPENAI_API_KEY"),
+        model=model,
+        max_retries=0
+    ))
+
+
+def _create_local_embeddings(model: str, openai_api_key: Optional[str]) -> Embeddings:
+    return LocalEmbeddings(model)
+
+
+# Provider name -> (factory, default model)
+EMBEDDING_PROVIDERS = {
+    "openai": (_create_openai_embeddings, DEFAULT_OPENAI_MODEL),
+    "local": (_create_local_embeddings, DEFAULT_LOCAL_MODEL),
+}
+
+
+def resolve_embedding_config(provider: Optional[str] = None, model: Optional[str] = None) -> Dict[str, str]:
+    """
+    Validate an embedding provider and fill in its default model.
+
+    Args:
+        provider: Provider name (optional, defaults to EMBEDDING_PROVIDER)
+        model: Model name (optional, defaults to EMBEDDING_MODEL or the provider's default)
+
+    Returns:
+        Dictionary with provider and model
+    """
+    provider = provider or EMBEDDING_PROVIDER
+    if provider not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider '{provider}'. Available: {', '.join(EMBEDDING_PROVIDERS)}")
+
+    if not model:
+        model = EMBEDDING_MODEL if provider == EMBEDDING_PROVIDER and EMBEDDING_MODEL else EMBEDDING_PROVIDERS[provider][1]
+
+    return {"provider": provider, "model": model}
+
+
+def get_class_embedding_config(class_name: str) -> Dict[str, str]:
+    """
+    Get the embedding provider and model a class was built with.
+
+    Args:
+        class_name: Name of the class
+
+    Returns:
+        Dictionary with provider and model
+    """
+    embedding = load_class_manifest(class_name).get("embedding")
+    if not embedding:
+        return dict(LEGACY_EMBEDDING_CONFIG)
+    return {"provider": embedding["provider"], "model": embedding["model"]}
+
+
+def save_class_embedding_config(class_name: str, config: Dict[str, str]) -> None:
+    """Record the embedding provider and model a class was built with in its manifest."""
+    manifest = load_class_manifest(class_name)
+    manifest["embedding"] = {"provider": config["provider"], "model": config["model"]}
+    save_class_manifest(class_name, manifest)
+
+
+_embeddings: Dict[Tuple[str, str, Optional[str]], Embeddings] = {}
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings(config: Dict[str, Any], openai_api_key: Optional[str] = None) -> Embeddings:
+    """
+    Get the shared embeddings instance for a provider and model.
+
+    Instances are created once per process, so local models are only loaded once.
+
+    Args:
+        config: Dictionary with provider and model
+        openai_api_key: OpenAI API key (optional)
+
+    Returns:
+        LangChain embeddings
+    """
+    config = resolve_embedding_config(config.get("provider"), config.get("model"))
+    key = (config["provider"], config["model"], openai_api_key)
+
+    with _embeddings_lock:
+        if key not in _embeddings:
+            factory = EMBEDDING_PROVIDERS[config["provider"]][0]
+            _embeddings[key] = factory(config["model"], openai_api_key)
+        return _embeddings[key]
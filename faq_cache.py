@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import threading
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import numpy as np
+
+from storage import get_data_dir, get_collection_name
+from batch_qa import BatchQuestionRunner
+
+# Minimum cosine similarity between a question and an FAQ question to reuse its answer
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.92"))
+
+
+def parse_faq_entries(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Parse an instructor FAQ list.
+
+    Each line is either a question or a JSON object with a "question" field
+    and an optional "answer" written by the instructor. Blank lines and lines
+    starting with '#' are skipped.
+
+    Args:
+        lines: Lines of the FAQ file
+
+    Returns:
+        List of entries with a question and, if given, an answer
+    """
+    entries = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            data = json.loads(line)
+            question = str(data.get("question", "")).strip()
+            if question:
+                entries.append({"question": question, "answer": (data.get("answer") or "").strip() or None})
+        else:
+            entries.append({"question": line, "answer": None})
+    return entries
+
+
+def get_faq_path(class_name: str, faq_directory: Optional[str] = None) -> str:
+    """Get the path to a class's FAQ cache file."""
+    directory = faq_directory or get_data_dir("faq_cache")
+    return os.path.join(directory, f"{get_collection_name(class_name)}.json")
+
+
+def delete_faq_cache(class_name: str, faq_directory: Optional[str] = None) -> None:
+    """Delete the FAQ cache for a class if it exists."""
+    path = get_faq_path(class_name, faq_directory)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class FAQCache:
+    def __init__(self, faq_directory: Optional[str] = None, match_threshold: float = FAQ_MATCH_THRESHOLD):
+        """
+        Initialize the FAQ warm cache.
+
+        Entries are stored per class as JSON and kept in memory as a normalized
+        embedding matrix. The file's modification time is checked on each
+        lookup, so answers built by another worker are picked up.
+
+        Args:
+            faq_directory: Directory containing FAQ cache files (optional)
+            match_threshold: Minimum cosine similarity for a match
+        """
+        self.faq_directory = faq_directory
+        self.match_threshold = match_threshold
+
+        self._lock = threading.Lock()
+        # collection name -> (mtime, entries, normalized embedding matrix)
+        self._loaded: Dict[str, Tuple[int, List[Dict[str, Any]], np.ndarray]] = {}
+
+    def _load(self, class_name: str) -> Optional[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        collection_name = get_collection_name(class_name)
+        path = get_faq_path(class_name, self.faq_directory)
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._loaded.pop(collection_name, None)
+            return None
+
+        with self._lock:
+            cached = self._loaded.get(collection_name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f).get("entries", [])
+        except Exception as e:
+            print(f"Error loading FAQ cache for class '{class_name}': {e}")
+            return None
+
+        if not entries:
+            return None
+
+        matrix = np.array([entry["embedding"] for entry in entries], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            self._loaded[collection_name] = (mtime, entries, matrix)
+        return entries, matrix
+
+    def has_entries(self, class_name: str) -> bool:
+        """Check whether a class has any FAQ answers."""
+        return self._load(class_name) is not None
+
+    def list_entries(self, class_name: str) -> List[Dict[str, Any]]:
+        """Get a class's FAQ questions and answers without their embeddings."""
+        loaded = self._load(class_name)
+        if loaded is None:
+            return []
+
+        return [{k: v for k, v in entry.items() if k != "embedding"} for entry in loaded[0]]
+
+    def match(self, class_name: str, query_embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Find the FAQ entry closest to a question.
+
+        Args:
+            class_name: Name of the class
+            query_embedding: Embedding of the incoming question
+
+        Returns:
+            Matching entry with its similarity score, or None if nothing is close enough
+        """
+        loaded = self._load(class_name)
+        if loaded is None:
+            return None
+
+        entries, matrix = loaded
+        query = np.asarray(query_embedding, dtype=np.float32)
+
+        # Answers embedded before the class switched embedding models can't be compared
+        if query.shape[0] != matrix.shape[1]:
+            return None
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        score = float(similarities[best])
+
+        if score < self.match_threshold:
+            return None
+
+        match = {k: v for k, v in entries[best].items() if k != "embedding"}
+        match["score"] = score
+        return match
+
+    def save_entries(self, class_name: str, entries: List[Dict[str, Any]]) -> None:
+        """
+        Replace the FAQ cache for a class.
+
+        Args:
+            class_name: Name of the class
+            entries: Entries with question, answer, sources and embedding
+        """
+        path = get_faq_path(class_name, self.faq_directory)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"class_name": class_name, "updated_at": time.time(), "entries": entries}, f)
+        os.replace(tmp_path, path)
+
+    def build(self, chatbot: Any, class_name: str, faq_entries: List[Dict[str, Any]], concurrency: int = 4) -> Dict[str, Any]:
+        """
+        Generate and store answers for a class's FAQ list.
+
+        Questions are embedded in one batch. Questions without an instructor
+        answer are answered through the normal RAG path, bypassing the
+        existing FAQ cache so stale answers aren't copied forward.
+
+        Args:
+            chatbot: CourseAssistantChatbot used to answer questions
+            class_name: Name of the class
+            faq_entries: Entries from parse_faq_entries
+            concurrency: Number of questions answered at once
+
+        Returns:
+            Summary with the number of cached answers, failures, tokens and cost
+        """
+        questions = [entry["question"] for entry in faq_entries]
+        embeddings = chatbot.vector_store_manager.get_class_embeddings(class_name).embed_documents(questions)
+        created_at = time.time()
+
+        entries: List[Optional[Dict[str, Any]]] = [None] * len(faq_entries)
+        pending = []
+        for index, (faq_entry, embedding) in enumerate(zip(faq_entries, embeddings)):
+            if faq_entry.get("answer"):
+                entries[index] = {
+                    "question": faq_entry["question"],
+                    "answer": faq_entry["answer"],
+                    "sources": [],
+                    "origin": "instructor",
+                    "embedding": embedding,
+                    "created_at": created_at
+                }
+            else:
+                pending.append(index)
+
+        summary = {"questions": len(faq_entries), "cached": 0, "failed": 0, "tokens_used": 0, "cost": 0.0}
+
+        runner = BatchQuestionRunner(chatbot, concurrency=concurrency, response_options={"use_faq": False, "usage_source": "faq_build"})
+        results = runner.run(
+            class_name,
+            [questions[i] for i in pending],
+            query_embeddings=[embeddings[i] for i in pending]
+        )
+        for result in results:
+            index = pending[result["index"]]
+            summary["tokens_used"] += result["tokens_used"]
+            summary["cost"] += result["cost"]
+
+            if result["error"] is not None or not result["answer"]:
+                print(f"Could not answer FAQ question '{result['question']}': {result['error']}")
+                summary["failed"] += 1
+                continue
+
+            # Questions the materials don't cover are left to the normal path
+            if result["retrieval"] and not result["retrieval"].get("kept"):
+                print(f"No course material found for FAQ question '{result['question']}'")
+                summary["failed"] += 1
+                continue
+
+            entries[index] = {
+                "question": result["question"],
+                "answer": result["answer"],
+                "sources": result["sources"],
+                "origin": "generated",
+                "embedding": embeddings[index],
+                "created_at": created_at
+            }
+
+        entries = [entry for entry in entries if entry is not None]
+        self.save_entries(class_name, entries)
+        summary["cached"] = len(entries)
+
+        print(f"Cached {len(entries)} FAQ answers for class '{class_name}'")
+        return summary
@@ -0,0 +1,211 @@
+import os
+import time
+import uuid
+import queue
+import threading
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents import Document
+
+from dedup import ChunkDeduplicator, DUPLICATE_SOURCES_KEY
+
+# Chunks embedded per API call and written per store call
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+
+# Batches allowed to wait between stages; bounds memory no matter how large a course is
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+
+# Embedding calls in flight at once
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+
+# Seconds between checks for a failure in another stage while blocked on a queue
+_POLL_INTERVAL = 0.1
+
+# A batch waiting between stages: (chunk ids, texts, metadatas)
+Batch = Tuple[List[str], List[str], List[Dict[str, Any]]]
+
+
+class StreamingIngestor:
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = INGEST_BATCH_SIZE,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        embed_workers: int = INGEST_EMBED_WORKERS
+    ):
+        """
+        Initialize a streaming chunks -> embeddings -> store pipeline.
+
+        Chunks are pulled lazily, deduplicated, grouped into batches, embedded
+        by a few worker threads and written to the collection as they arrive.
+        The queues between stages are bounded, so a slow stage makes the ones
+        before it wait instead of buffering the whole course in memory.
+
+        Args:
+            embeddings: Embeddings used to embed chunk text
+            batch_size: Chunks per embedding call and store write
+            queue_size: Maximum batches waiting between two stages
+            embed_workers: Number of embedding threads
+        """
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(1, queue_size)
+        self.embed_workers = max(1, embed_workers)
+
+    def ingest(
+        self,
+        chunks: Iterable[Document],
+        collection: Any,
+        deduplicator: Optional[ChunkDeduplicator] = None
+    ) -> Dict[str, Any]:
+        """
+        Embed and store chunks without holding more than a few batches in memory.
+
+        Back-references to duplicates found after a chunk was stored are applied
+        with one metadata update pass at the end. If any stage fails, the chunks
+        written by this call are removed again and the error is raised.
+
+        Args:
+            chunks: Chunks in document order (may be a one-pass iterator)
+            collection: Chroma collection to add the chunks to
+            deduplicator: Near-duplicate detector (optional)
+
+        Returns:
+            Dictionary with the number of chunks stored, batches and elapsed time
+        """
+        start_time = time.monotonic()
+        id_prefix = uuid.uuid4().hex
+        stop = threading.Event()
+        errors: List[Exception] = []
+        embed_queue: "queue.Queue[Optional[Batch]]" = queue.Queue(maxsize=self.queue_size)
+        write_queue: "queue.Queue[Optional[Tuple[Batch, List[List[float]]]]]" = queue.Queue(maxsize=self.queue_size)
+        produced = {"chunks": 0, "batches": 0}
+        # Kept chunks are numbered by the deduplicator in the same order as they are produced
+        first_kept = deduplicator.kept_count if deduplicator is not None else 0
+
+        def chunk_id(number: int) -> str:
+            return f"{id_prefix}-{number}"
+
+        def put(target: queue.Queue, item: Any) -> bool:
+            # Block while the next stage is busy, but give up if another stage failed
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=_POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(source: queue.Queue) -> Any:
+            while not stop.is_set():
+                try:
+                    return source.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+            return None
+
+        def fail(error: Exception) -> None:
+            errors.append(error)
+            stop.set()
+
+        def produce() -> None:
+            batch: Batch = ([], [], [])
+            try:
+                for chunk in chunks:
+                    if stop.is_set():
+                        return
+                    if deduplicator is not None and deduplicator.add(chunk) is None:
+                        continue
+
+                    # Copy the metadata: the deduplicator keeps updating the original
+                    batch[0].append(chunk_id(produced["chunks"]))
+                    batch[1].append(chunk.page_content)
+                    batch[2].append(dict(chunk.metadata))
+                    produced["chunks"] += 1
+
+                    if len(batch[0]) >= self.batch_size:
+                        if not put(embed_queue, batch):
+                            return
+                        produced["batches"] += 1
+                        batch = ([], [], [])
+
+                if batch[0] and put(embed_queue, batch):
+                    produced["batches"] += 1
+            except Exception as e:
+                fail(e)
+            finally:
+                for _ in range(self.embed_workers):
+                    put(embed_queue, None)
+
+        def embed() -> None:
+            try:
+                while True:
+                    batch = get(embed_queue)
+                    if batch is None:
+                        return
+                    vectors = self.embeddings.embed_documents(batch[1])
+                    if not put(write_queue, (batch, vectors)):
+                        return
+            except Exception as e:
+                fail(e)
+            finally:
+                put(write_queue, None)
+
+        threads = [threading.Thread(target=produce, name="ingest-chunks", daemon=True)]
+        threads += [
+            threading.Thread(target=embed, name=f"ingest-embed-{i}", daemon=True)
+            for i in range(self.embed_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Store writes happen on the calling thread
+        written = 0
+        finished_workers = 0
+        try:
+            while finished_workers < self.embed_workers:
+                item = get(write_queue)
+                if item is None:
+                    if stop.is_set():
+                        break
+                    finished_workers += 1
+                    continue
+                (ids, texts, metadatas), vectors = item
+                collection.add(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+                written += len(ids)
+        except Exception as e:
+            fail(e)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        if not errors and deduplicator is not None:
+            try:
+                updates = [(number - first_kept, refs) for number, refs in deduplicator.pop_updated() if number >= first_kept]
+                for offset in range(0, len(updates), self.batch_size):
+                    batch_updates = updates[offset:offset + self.batch_size]
+                    collection.update(
+                        ids=[chunk_id(number) for number, _ in batch_updates],
+                        metadatas=[{DUPLICATE_SOURCES_KEY: refs} for _, refs in batch_updates]
+                    )
+            except Exception as e:
+                errors.append(e)
+
+        if errors:
+            self._remove_chunks(collection, id_prefix, produced["chunks"])
+            raise errors[0]
+
+        return {
+            "chunks": written,
+            "batches": produced["batches"],
+            "elapsed_seconds": round(time.monotonic() - start_time, 2)
+        }
+
+    def _remove_chunks(self, collection: Any, id_prefix: str, count: int) -> None:
+        # Don't leave a half-built class behind; ids that were never written are ignored
+        try:
+            for offset in range(0, count, 1000):
+                collection.delete(ids=[f"{id_prefix}-{number}" for number in range(offset, min(count, offset + 1000))])
+        except Exception as e:
+            print(f"Error removing partially ingested chunks: {e}")
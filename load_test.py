@@ -0,0 +1,493 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from stub_openai_server import StubSettings, start_stub_server
+
+# Matches FIXED_PASSWORD in app.py
+DEFAULT_PASSWORD = os.getenv("LOAD_TEST_PASSWORD", "$@k$h@M")
+
+SEED_CLASS_NAME = "Load Test 101"
+
+ROUTES = ("/login", "/list-classes", "/chat", "/add-class")
+
+QUESTIONS = [
+    "What is gradient descent?",
+    "When is the midterm?",
+    "Explain the difference between bias and variance.",
+    "How does backpropagation work?",
+    "What is regularization used for?",
+    "Summarize lecture 3.",
+    "What is a confusion matrix?",
+    "How do I choose the learning rate?",
+]
+
+TOPICS = [
+    "gradient descent", "bias and variance", "backpropagation", "regularization",
+    "confusion matrices", "learning rates", "decision trees", "neural networks",
+]
+
+
+def make_test_pdf(pages: List[List[str]]) -> bytes:
+    """
+    Build a minimal PDF with one text line per entry, used to drive /add-class.
+
+    Args:
+        pages: Lines of text for each page
+
+    Returns:
+        PDF file contents
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+
+    for lines in pages:
+        text = " ".join(
+            f"({line.replace(chr(92), '').replace('(', '').replace(')', '')}) Tj T*" for line in lines
+        )
+        stream = f"BT /F1 11 Tf 14 TL 50 750 Td {text} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        page_ids.append(len(objects))
+
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1")
+    return bytes(output)
+
+
+def make_course_pdf(page_count: int = 12, seed: int = 0) -> bytes:
+    """Build a synthetic course PDF with a few paragraphs per page."""
+    rng = random.Random(seed)
+    pages = []
+    for page in range(page_count):
+        topic = TOPICS[page % len(TOPICS)]
+        lines = [f"Chapter {page + 1}: {topic.title()}"]
+        for _ in range(30):
+            lines.append(f"This section discusses {topic} and how it relates to {rng.choice(TOPICS)} in practice.")
+        pages.append(lines)
+    return make_test_pdf(pages)
+
+
+def _encode_multipart(fields: Dict[str, str], files: Dict[str, Tuple[str, bytes]]) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for name, value in fields.items():
+        body += f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode("utf-8")
+    for name, (filename, content) in files.items():
+        body += (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n"
+        ).encode("utf-8")
+        body += content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode("utf-8")
+    return bytes(body), f"multipart/form-data; boundary={boundary}"
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Redirects after login and add-class are counted as the response, not followed
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class RouteStats:
+    def __init__(self):
+        """Collect latencies and outcomes per route."""
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def add(self, route: str, latency: float, status: str, ok: bool) -> None:
+        with self._lock:
+            self.latencies[route].append(latency)
+            self.status_codes[route][status] += 1
+            if not ok:
+                self.errors[route] += 1
+
+    def summarize(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        """Summarize throughput, latency percentiles and error rates per route."""
+        def percentile(ordered: List[float], p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 1)
+
+        summary = {}
+        with self._lock:
+            routes = {route: sorted(latencies) for route, latencies in self.latencies.items()}
+            all_latencies = sorted(l for latencies in routes.values() for l in latencies)
+            routes["all"] = all_latencies
+            errors = dict(self.errors, all=sum(self.errors.values()))
+            status_codes = {route: dict(codes) for route, codes in self.status_codes.items()}
+
+        for route, ordered in routes.items():
+            summary[route] = {
+                "requests": len(ordered),
+                "errors": errors.get(route, 0),
+                "error_rate": round(errors.get(route, 0) / len(ordered), 4) if ordered else 0.0,
+                "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else None,
+                "p50_ms": percentile(ordered, 50),
+                "p90_ms": percentile(ordered, 90),
+                "p95_ms": percentile(ordered, 95),
+                "p99_ms": percentile(ordered, 99),
+                "max_ms": round(ordered[-1] * 1000, 1) if ordered else None,
+                "status_codes": status_codes.get(route, {})
+            }
+        return summary
+
+
+class VirtualUser:
+    def __init__(self, base_url: str, stats: RouteStats, password: str, timeout: float):
+        """
+        A simulated browser session with its own cookies.
+
+        Args:
+            base_url: Base URL of the app
+            stats: Shared statistics collector
+            password: Login password
+            timeout: Seconds to wait for each response
+        """
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.password = password
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect())
+
+    def request(
+        self,
+        route: str,
+        path: str,
+        data: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[int, bytes, Dict[str, str]]:
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers or {})
+        start_time = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                body = response.read()
+                status, response_headers = response.status, dict(response.headers)
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            status, response_headers = e.code, dict(e.headers)
+        except Exception as e:
+            self.stats.add(route, time.perf_counter() - start_time, type(e).__name__, ok=False)
+            return 0, b"", {}
+
+        # Failures that redirect (lost session, flashed form errors) go back to the same page or to login
+        location = response_headers.get("Location", "")
+        ok = status < 400 and not (route in location or (route != "/login" and "/login" in location))
+        if data is not None and route in ("/login", "/add-class"):
+            # A successful form post always redirects; a 200 is the form re-rendered with an error
+            ok = ok and status == 302
+        self.stats.add(route, time.perf_counter() - start_time, str(status), ok=ok)
+        return status, body, response_headers
+
+    def login(self) -> bool:
+        data = urllib.parse.urlencode({"password": self.password}).encode("utf-8")
+        status, _, headers = self.request("/login", "/login", data, {"Content-Type": "application/x-www-form-urlencoded"})
+        return status == 302 and "/login" not in headers.get("Location", "")
+
+    def list_classes(self) -> None:
+        self.request("/list-classes", "/list-classes")
+
+    def chat(self, class_name: str, question: str) -> None:
+        data = json.dumps({"class_name": class_name, "question": question}).encode("utf-8")
+        self.request("/chat", "/chat", data, {"Content-Type": "application/json"})
+
+    def add_class(self, class_name: str, pdf: bytes) -> bool:
+        body, content_type = _encode_multipart(
+            {"class_name": class_name, "chunking_profile": "balanced"},
+            {"textbook": ("textbook.pdf", pdf)}
+        )
+        status, _, headers = self.request("/add-class", "/add-class", body, {"Content-Type": content_type})
+        return status == 302 and "/add-class" not in headers.get("Location", "")
+
+
+def arrival_offsets(pattern: str, users: int, duration: float, burst_window: float, seed: int) -> List[float]:
+    """
+    Get the start time of each virtual user, in seconds from the start of the test.
+
+    Args:
+        pattern: 'constant', 'poisson', 'ramp' or 'burst'
+        users: Number of virtual users
+        duration: Length of the arrival period in seconds
+        burst_window: Seconds over which a burst arrives
+        seed: Random seed
+
+    Returns:
+        Sorted start offsets
+    """
+    rng = random.Random(seed)
+
+    if pattern == "constant":
+        return [i * duration / users for i in range(users)]
+    if pattern == "poisson":
+        rate = users / duration
+        offsets, t = [], 0.0
+        for _ in range(users):
+            t += rng.expovariate(rate)
+            offsets.append(min(t, duration))
+        return offsets
+    if pattern == "ramp":
+        # Arrival rate grows linearly, so the n-th arrival is at duration * sqrt(n / users)
+        return [duration * ((i + 1) / users) ** 0.5 for i in range(users)]
+    if pattern == "burst":
+        # Everyone opens the assistant within a short window, e.g. right after a lecture
+        return sorted(rng.uniform(0, burst_window) for _ in range(users))
+
+    raise ValueError(f"Unknown arrival pattern '{pattern}'")
+
+
+def run_load(
+    base_url: str,
+    pattern: str = "burst",
+    users: int = 50,
+    duration: float = 60.0,
+    burst_window: float = 10.0,
+    questions_per_user: int = 3,
+    think_time: float = 2.0,
+    add_class_users: int = 0,
+    password: str = DEFAULT_PASSWORD,
+    timeout: float = 120.0,
+    seed: int = 42
+) -> Dict[str, Any]:
+    """
+    Drive the app with virtual users and collect per-route statistics.
+
+    Each student logs in, lists classes, then asks questions with a random
+    think time between them. Instructor users also upload a class.
+
+    Returns:
+        Per-route summary and run settings
+    """
+    stats = RouteStats()
+    rng = random.Random(seed)
+    offsets = arrival_offsets(pattern, users, duration, burst_window, seed)
+    instructor_indexes = set(rng.sample(range(users), min(add_class_users, users)))
+    instructor_pdf = make_course_pdf(page_count=4, seed=seed) if instructor_indexes else b""
+
+    def user_session(index: int) -> None:
+        user_rng = random.Random(seed + index)
+        user = VirtualUser(base_url, stats, password, timeout)
+
+        if not user.login():
+            return
+        user.list_classes()
+
+        if index in instructor_indexes:
+            user.add_class(f"Load Test Upload {index}", instructor_pdf)
+
+        for _ in range(questions_per_user):
+            user.chat(SEED_CLASS_NAME, user_rng.choice(QUESTIONS))
+            time.sleep(user_rng.expovariate(1 / think_time) if think_time > 0 else 0)
+
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=min(users, 1000), thread_name_prefix="user") as executor:
+        for index, offset in enumerate(offsets):
+            delay = start_time + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(user_session, index)
+    elapsed = time.monotonic() - start_time
+
+    return {
+        "pattern": pattern,
+        "users": users,
+        "elapsed_seconds": round(elapsed, 2),
+        "routes": stats.summarize(elapsed)
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            with urllib.request.urlopen(base_url + "/login", timeout=2):
+                return
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError("gunicorn did not become ready in time")
+
+
+def parse_worker_config(spec: str) -> Dict[str, Any]:
+    """Parse a worker configuration such as '2x4' (2 workers, 4 threads each)."""
+    workers, _, threads = spec.partition("x")
+    return {"name": spec, "workers": int(workers), "threads": int(threads or 1)}
+
+
+def run_worker_config(config: Dict[str, Any], stub_url: str, load_options: Dict[str, Any], keep_data: bool = False) -> Dict[str, Any]:
+    """
+    Start gunicorn with a worker configuration on a fresh data directory, seed a class and run the load.
+
+    Args:
+        config: Worker configuration from parse_worker_config
+        stub_url: Base URL of the stub OpenAI server (ending in /v1)
+        load_options: Keyword arguments for run_load
+        keep_data: Keep the temporary data directory for inspection
+
+    Returns:
+        Load results for this configuration
+    """
+    data_dir = tempfile.mkdtemp(prefix="courseta-load-")
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    # Stub embeddings are random, so relax the retrieval cut-off to make every chat reach the LLM
+    env = {"RETRIEVAL_MIN_SCORE": "-1000", "RETRIEVAL_SCORE_MARGIN": "1000"}
+    env.update(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": stub_url,
+        "RAILWAY_VOLUME_MOUNT_PATH": data_dir
+    })
+    command = [
+        sys.executable, "-m", "gunicorn", "app:app",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(config["workers"]),
+        "--threads", str(config["threads"]),
+        "--timeout", "300"
+    ]
+
+    log_path = os.path.join(data_dir, "gunicorn.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            command, cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+
+    try:
+        _wait_until_ready(base_url, process)
+
+        # Seed the class every student asks about
+        seeder = VirtualUser(base_url, RouteStats(), load_options.get("password", DEFAULT_PASSWORD), 300)
+        if not seeder.login() or not seeder.add_class(SEED_CLASS_NAME, make_course_pdf()):
+            raise RuntimeError(f"Could not seed the test class; see {log_path}")
+
+        print(f"Running {load_options.get('pattern', 'burst')} load against {config['name']} "
+              f"({config['workers']} workers x {config['threads']} threads)", file=sys.stderr)
+        result = run_load(base_url, **load_options)
+        result["config"] = config
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if not keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        else:
+            print(f"Kept data directory {data_dir}", file=sys.stderr)
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    """Print one table row per worker configuration and route."""
+    header = f"{'config':>8} {'route':<14} {'reqs':>6} {'rps':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        for route in ROUTES + ("all",):
+            row = result["routes"].get(route)
+            if not row:
+                continue
+            print(
+                f"{result['config']['name']:>8} {route:<14} {row['requests']:>6} {row['throughput_rps']:>7} "
+                f"{row['error_rate'] * 100:>5.1f}% {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app under gunicorn against a stub OpenAI server.")
+    parser.add_argument("--configs", default="1x1,2x4,4x4",
+                        help="Comma-separated gunicorn configurations as WORKERSxTHREADS")
+    parser.add_argument("--pattern", choices=["constant", "poisson", "ramp", "burst"], default="burst")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60.0, help="Arrival period for constant/poisson/ramp")
+    parser.add_argument("--burst-window", type=float, default=10.0, help="Seconds over which a burst arrives")
+    parser.add_argument("--questions", type=int, default=3, help="Questions per user")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Mean seconds between a user's questions")
+    parser.add_argument("--add-class-users", type=int, default=1, help="Users who also upload a class")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--stub-url", help="Use an already running stub server (e.g. http://127.0.0.1:8001/v1)")
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=200.0)
+    parser.add_argument("--stub-slow-fraction", type=float, default=0.02)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="Write full results to this file")
+    parser.add_argument("--keep-data", action="store_true", help="Keep each run's data directory and gunicorn log")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    stub_url = args.stub_url
+    if not stub_url:
+        # The stub runs in this process on its own threads
+        server = start_stub_server(StubSettings(
+            latency_ms=args.stub_latency_ms,
+            jitter_ms=args.stub_jitter_ms,
+            slow_fraction=args.stub_slow_fraction,
+            error_rate=args.stub_error_rate
+        ))
+        stub_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    load_options = {
+        "pattern": args.pattern,
+        "users": args.users,
+        "duration": args.duration,
+        "burst_window": args.burst_window,
+        "questions_per_user": args.questions,
+        "think_time": args.think_time,
+        "add_class_users": args.add_class_users,
+        "timeout": args.timeout,
+        "seed": args.seed
+    }
+
+    results = []
+    for spec in args.configs.split(","):
+        results.append(run_worker_config(parse_worker_config(spec.strip()), stub_url, load_options, args.keep_data))
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import gzip
+import json
+import hashlib
+from typing import Iterator, Optional
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+
+from storage import get_data_dir
+
+# Bump this whenever text extraction changes so stale cache entries are ignored
+EXTRACTOR_VERSION = "pypdf-1"
+
+HASH_BUFFER_SIZE = 1024 * 1024  # 1 MB
+
+
+def hash_file(path: str) -> str:
+    """Compute the SHA-256 hex digest of a file in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageTextCache:
+    def __init__(self, cache_directory: Optional[str] = None, extractor_version: str = EXTRACTOR_VERSION):
+        """
+        Initialize the extracted page text cache.
+
+        Each PDF is stored once as gzip-compressed JSON lines (one page per
+        line), keyed by the PDF's content hash and the extractor version.
+
+        Args:
+            cache_directory: Directory for cache files (optional, defaults to the data volume)
+            extractor_version: Version tag of the text extractor
+        """
+        self.cache_directory = cache_directory or get_data_dir("page_cache")
+        self.extractor_version = extractor_version
+        os.makedirs(self.cache_directory, exist_ok=True)
+
+    def get_cache_path(self, file_hash: str) -> str:
+        """Get the cache file path for a PDF content hash."""
+        return os.path.join(
+            self.cache_directory,
+            file_hash[:2],
+            f"{file_hash}-{self.extractor_version}.jsonl.gz"
+        )
+
+    def has_pages(self, file_hash: str) -> bool:
+        """Check whether extracted pages for a PDF hash are cached."""
+        return os.path.exists(self.get_cache_path(file_hash))
+
+    def iter_pages(self, file_hash: str, source: Optional[str] = None) -> Iterator[Document]:
+        """
+        Read cached pages for a PDF one at a time.
+
+        Args:
+            file_hash: SHA-256 of the PDF
+            source: Value for the 'source' metadata field (optional)
+
+        Yields:
+            LangChain Document objects, one per page
+        """
+        with gzip.open(self.get_cache_path(file_hash), "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                metadata = record["metadata"]
+                metadata["source"] = source or metadata.get("source", "")
+                metadata["file_hash"] = file_hash
+                yield Document(page_content=record["page_content"], metadata=metadata)
+
+    def _extract_to_cache(self, pdf_path: str, file_hash: str) -> int:
+        cache_path = self.get_cache_path(file_hash)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        page_count = 0
+
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                for page in PyPDFLoader(pdf_path).lazy_load():
+                    # The source path is usually a temporary upload path, so don't cache it
+                    metadata = {k: v for k, v in page.metadata.items() if k != "source"}
+                    f.write(json.dumps({"page_content": page.page_content, "metadata": metadata}))
+                    f.write("\n")
+                    page_count += 1
+
+            os.replace(tmp_path, cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return page_count
+
+    def ensure_cached(self, pdf_path: str) -> str:
+        """
+        Extract and cache the pages of a PDF unless they are already cached.
+
+        Pages are streamed to the cache file, so the whole PDF's text is never
+        held in memory. Read them back with iter_pages.
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Returns:
+            File hash of the PDF
+        """
+        file_hash = hash_file(pdf_path)
+
+        if self.has_pages(file_hash):
+            print(f"Using cached page text for {pdf_path}")
+        else:
+            page_count = self._extract_to_cache(pdf_path, file_hash)
+            print(f"Cached {page_count} pages from {pdf_path}")
+
+        return file_hash
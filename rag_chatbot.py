@@ -1,11 +1,20 @@
 import os
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
 from langchain.callbacks import get_openai_callback
 from vector_store import VectorStoreManager
+from dedup import DUPLICATE_SOURCES_KEY, parse_source_refs
+from admission import AdmissionController, AdmissionRejected
+from resilient import get_caller
+from faq_cache import FAQCache
+from usage_ledger import UsageLedger, get_usage_ledger
+from storage import get_collection_name
 
 # Load environment variables
 load_dotenv()
@@ -16,7 +25,9 @@ class CourseAssistantChatbot:
         openai_api_key: Optional[str] = None,
         model_name: str = "gpt-4o",
         temperature: float = 0.2,
-        vector_store_directory: str = "chroma_db"
+        vector_store_directory: str = "chroma_db",
+        admission_controller: Optional[AdmissionController] = None,
+        usage_ledger: Optional[UsageLedger] = None
     ):
         """
         Initialize the RAG chatbot.
@@ -26,30 +37,63 @@ class CourseAssistantChatbot:
             model_name: OpenAI model name to use
             temperature: Temperature for model generation (0-1)
             vector_store_directory: Directory for vector stores
+            admission_controller: Limits concurrent model calls (optional, configured from env)
+            usage_ledger: Records usage per request (optional, defaults to the shared ledger)
         """
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         self.model_name = model_name
         self.temperature = temperature
         
-        # Initialize OpenAI LLM
+        # Initialize OpenAI LLM. Timeouts, retries and hedging are handled by
+        # the resilient caller, so the client itself doesn't retry.
+        self.llm_caller = get_caller("chat")
         self.llm = ChatOpenAI(
             api_key=self.openai_api_key,
             model_name=model_name,
-            temperature=temperature
+            temperature=temperature,
+            timeout=self.llm_caller.attempt_timeout,
+            max_retries=0
         )
         
+        # Per-request tokens, cost and latency, written in the background
+        self.usage_ledger = usage_ledger or get_usage_ledger()
+        
+        # Precomputed answers for instructor FAQ questions
+        self.faq_cache = FAQCache()
+        
+        # Bound concurrent model calls globally and per class
+        self.admission = admission_controller or AdmissionController.from_env()
+        
         # Initialize vector store manager
         self.vector_store_manager = VectorStoreManager(
             base_persist_directory=vector_store_directory,
             openai_api_key=self.openai_api_key
         )
         
-        # Define system prompt template
+        # Adaptive retrieval: fetch a larger candidate set, then keep only hits
+        # above an absolute relevance floor and within a margin of the best hit.
+        # Relevance is 1 - d/sqrt(2), where d is Chroma's squared L2 distance
+        # (2 - 2cos for normalized embeddings), so score = 1 - sqrt(2) * (1 - cos).
+        # A floor of -0.02 corresponds to a cosine similarity of about 0.28, and
+        # the 0.1 margin to about 0.07 in cosine.
+        self.retrieval_candidates = int(os.getenv("RETRIEVAL_CANDIDATES", "12"))
+        self.retrieval_max_k = int(os.getenv("RETRIEVAL_MAX_K", "5"))
+        self.retrieval_min_score = float(os.getenv("RETRIEVAL_MIN_SCORE", "-0.02"))
+        self.retrieval_score_margin = float(os.getenv("RETRIEVAL_SCORE_MARGIN", "0.1"))
+        
+        # Previous exchanges sent with each question
+        self.history_turns = int(os.getenv("CHAT_HISTORY_TURNS", "3"))
+        
+        # Define system prompt template. It only depends on the class, so the
+        # same prefix is sent for every question and can be served from the
+        # provider's prompt cache; retrieved context goes in the last message.
         self.system_template = """
         You are CourseTA, a helpful and knowledgeable teaching assistant for the course: {class_name}.
         
         Your goal is to help students understand concepts, answer their questions, and provide guidance based on the course materials.
         
+        Each question comes with context information retrieved from the course materials.
+        
         When answering:
         1. Only use information from the provided context - do not use external knowledge
         2. If the answer isn't in the context, say "I don't have enough information to answer that question based on the course materials."
@@ -57,34 +101,211 @@ class CourseAssistantChatbot:
         4. Explain concepts clearly as if teaching a student
         5. Use appropriate formatting (bullet points, italics, etc.) to make your answer easy to understand
         
-        Context information:
-        {context}
-        
         Remember: You are a teaching assistant, so maintain a helpful, educational tone. 
         Be concise but thorough, and make sure your explanations are clear and accessible.
         """
+        
+        # Rendered system messages by class label
+        self._system_messages: Dict[str, SystemMessage] = {}
+        self._system_messages_lock = threading.Lock()
+    
+        # Thread pool for fanning out retrieval across class collections
+        self.retrieval_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RETRIEVAL_WORKERS", "8")),
+            thread_name_prefix="retrieval"
+        )
     
     def get_available_classes(self) -> List[str]:
         """Get a list of available classes."""
         return self.vector_store_manager.list_available_classes()
     
+    def _invoke_llm(self, class_key: str, messages: List[BaseMessage]) -> Any:
+        """Call the chat model once a concurrency slot is available."""
+        with self.admission.slot(class_key.lower()):
+            return self.llm_caller.call(self.llm.invoke, messages)
+    
+    def _system_message(self, class_label: str) -> SystemMessage:
+        """Get the system message for a class, rendering it only once."""
+        message = self._system_messages.get(class_label)
+        if message is None:
+            with self._system_messages_lock:
+                message = self._system_messages.setdefault(
+                    class_label, SystemMessage(content=self.system_template.format(class_name=class_label))
+                )
+        return message
+    
+    def _build_messages(
+        self,
+        class_label: str,
+        context_text: str,
+        question: str,
+        chat_history: Optional[List[Tuple[str, str]]]
+    ) -> List[BaseMessage]:
+        """
+        Assemble the model input so it starts with as long a stable prefix as possible.
+        
+        The order is the class's system message, then recent exchanges, then the
+        retrieved context and the question. Follow-up questions in a conversation
+        repeat everything before the new context, so it can be cached.
+        
+        Args:
+            class_label: Class name (or names) shown in the system message
+            context_text: Formatted context from retrieved documents
+            question: User's question
+            chat_history: List of (question, answer) tuples from previous conversation
+            
+        Returns:
+            List of messages for the chat model
+        """
+        messages: List[BaseMessage] = [self._system_message(class_label)]
+        
+        if chat_history and self.history_turns > 0:
+            for user_msg, ai_msg in chat_history[-self.history_turns:]:
+                messages.append(HumanMessage(content=user_msg))
+                messages.append(AIMessage(content=ai_msg))
+        
+        messages.append(HumanMessage(content=f"Context information:\n{context_text}\n\nQuestion: {question}"))
+        return messages
+    
+    def _relevance_cutoff(self, scores: List[float]) -> Optional[float]:
+        """Get the minimum score a hit needs to be used, or None if nothing is relevant."""
+        if not scores or max(scores) < self.retrieval_min_score:
+            return None
+        
+        return max(self.retrieval_min_score, max(scores) - self.retrieval_score_margin)
+    
+    def _select_relevant(self, docs_with_scores: List[Tuple[Any, float]]) -> List[Tuple[Any, float]]:
+        """Keep the hits that clear the relevance floor and are close to the best hit."""
+        cutoff = self._relevance_cutoff([score for _, score in docs_with_scores])
+        
+        if cutoff is None:
+            return []
+        
+        ranked = sorted(docs_with_scores, key=lambda pair: pair[1], reverse=True)
+        return [(doc, score) for doc, score in ranked if score >= cutoff][:self.retrieval_max_k]
+    
+    def _no_relevant_context_response(self, candidates: int, top_score: Optional[float]) -> Dict[str, Any]:
+        """Answer without calling the model when nothing relevant was retrieved."""
+        return {
+            "answer": "I don't have enough information to answer that question based on the course materials.",
+            "sources": [],
+            "tokens_used": 0,
+            "cost": 0.0,
+            "retrieval": {"candidates": candidates, "kept": 0, "top_score": top_score}
+        }
+    
+    def _record_usage(
+        self,
+        source: str,
+        class_name: str,
+        question: str,
+        response: Dict[str, Any],
+        start_time: float
+    ) -> None:
+        """Queue a usage ledger event for a response; never fails the request."""
+        try:
+            latency_ms = (time.monotonic() - start_time) * 1000
+            self.usage_ledger.record_response(
+                source, get_collection_name(class_name), self.model_name, question, response, latency_ms
+            )
+        except Exception as e:
+            print(f"Error recording usage: {e}")
+    
+    def _faq_response(self, faq_match: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer from a matching FAQ cache entry without calling the model."""
+        return {
+            "answer": faq_match["answer"],
+            "sources": faq_match.get("sources", []),
+            "tokens_used": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "cost": 0.0,
+            "faq_match": {"question": faq_match["question"], "score": round(faq_match["score"], 4)}
+        }
+    
+    def _format_context(self, retrieved_docs: List[Any], include_class: bool = False) -> str:
+        """Format retrieved documents as numbered context for the prompt."""
+        contexts = []
+        for i, doc in enumerate(retrieved_docs):
+            source_info = f"Source: {doc.metadata.get('document_type', 'Unknown')} - {doc.metadata.get('filename', 'Unknown')}"
+            if 'page' in doc.metadata:
+                source_info += f", Page {doc.metadata['page']}"
+            if doc.metadata.get(DUPLICATE_SOURCES_KEY):
+                source_info += f" (also in: {doc.metadata[DUPLICATE_SOURCES_KEY]})"
+            if include_class:
+                source_info = f"Class: {doc.metadata.get('class_name', 'Unknown')} - {source_info}"
+            
+            contexts.append(f"[Document {i+1}] {source_info}\n{doc.page_content}\n")
+        
+        return "\n\n".join(contexts)
+    
+    def _format_sources(self, retrieved_docs: List[Any]) -> List[Dict[str, Any]]:
+        """Format retrieved documents as citations for the response."""
+        sources = []
+        for doc in retrieved_docs:
+            source = {
+                "class_name": doc.metadata.get("class_name", "Unknown"),
+                "filename": doc.metadata.get("filename", "Unknown"),
+                "document_type": doc.metadata.get("document_type", "Unknown"),
+                "page": doc.metadata.get("page", "Unknown"),
+                "also_in": parse_source_refs(doc.metadata.get(DUPLICATE_SOURCES_KEY)),
+                "snippet": doc.page_content[:150] + "..." if len(doc.page_content) > 150 else doc.page_content
+            }
+            sources.append(source)
+        
+        return sources
+    
     def generate_response(
         self, 
         class_name: str, 
         question: str, 
-        chat_history: Optional[List[Tuple[str, str]]] = None
+        chat_history: Optional[List[Tuple[str, str]]] = None,
+        query_embedding: Optional[List[float]] = None,
+        admission_key: Optional[str] = None,
+        use_faq: bool = True,
+        usage_source: str = "chat"
     ) -> Dict[str, Any]:
         """
         Generate a response to a question.
         
+        Questions matching the class's FAQ cache are answered from it without
+        retrieval or a model call. Follow-up questions in a conversation skip
+        the cache, since short ones like "why?" only make sense with the history.
+        
         Args:
             class_name: Name of the class
             question: User's question
             chat_history: List of (question, answer) tuples from previous conversation
+            query_embedding: Precomputed embedding of the question (optional)
+            admission_key: Admission control queue to use (optional, defaults to the class)
+            use_faq: Whether to answer from the FAQ cache when the question matches
+            usage_source: Label recorded in the usage ledger (e.g., 'chat', 'batch')
             
         Returns:
             Dictionary with response and metadata
         """
+        start_time = time.monotonic()
+        try:
+            response = self._generate_response(
+                class_name, question, chat_history, query_embedding, admission_key, use_faq
+            )
+        except AdmissionRejected as e:
+            self._record_usage(usage_source, class_name, question, {"error": f"admission_rejected_{e.status_code}"}, start_time)
+            raise
+        
+        self._record_usage(usage_source, class_name, question, response, start_time)
+        return response
+    
+    def _generate_response(
+        self,
+        class_name: str,
+        question: str,
+        chat_history: Optional[List[Tuple[str, str]]],
+        query_embedding: Optional[List[float]],
+        admission_key: Optional[str],
+        use_faq: bool
+    ) -> Dict[str, Any]:
         # Get info about the class
         class_info = self.vector_store_manager.get_class_info(class_name)
         
@@ -93,9 +314,23 @@ class CourseAssistantChatbot:
                 "answer": f"Sorry, I couldn't find any information for the class '{class_name}'. Please make sure the class exists and has been properly added to the system.",
                 "sources": [],
                 "tokens_used": 0,
-                "cost": 0.0
+                "cost": 0.0,
+                "error": "Class not found"
             }
         
+        # Answer known questions from the FAQ cache. The embedding is reused for retrieval on a miss.
+        if use_faq and not chat_history and self.faq_cache.has_entries(class_name):
+            try:
+                if query_embedding is None:
+                    query_embedding = self.vector_store_manager.get_class_embeddings(class_name).embed_query(question)
+                
+                faq_match = self.faq_cache.match(class_name, query_embedding)
+                if faq_match:
+                    return self._faq_response(faq_match)
+            except Exception as e:
+                # Fall through to the normal path, which reports embedding errors
+                print(f"FAQ lookup failed for class '{class_name}': {e}")
+        
         # Get vector store
         vector_store = self.vector_store_manager.get_vector_store(class_name)
         
@@ -104,68 +339,229 @@ class CourseAssistantChatbot:
                 "answer": f"Error: Could not load vector store for class '{class_name}'.",
                 "sources": [],
                 "tokens_used": 0,
-                "cost": 0.0
+                "cost": 0.0,
+                "error": "Vector store unavailable"
             }
         
-        # Format chat history for the context
-        formatted_history = []
-        if chat_history:
-            for user_msg, ai_msg in chat_history:
-                formatted_history.append(HumanMessage(content=user_msg))
-                formatted_history.append(AIMessage(content=ai_msg))
-        
         try:
             # Track token usage and cost
             with get_openai_callback() as cb:
-                # Create prompt
-                prompt = ChatPromptTemplate.from_template(self.system_template)
+                # Retrieve a candidate set with relevance scores
+                if query_embedding is not None:
+                    candidates = self.vector_store_manager.search_by_vector(
+                        vector_store,
+                        query_embedding,
+                        self.retrieval_candidates
+                    )
+                else:
+                    candidates = vector_store.similarity_search_with_relevance_scores(
+                        question,
+                        k=self.retrieval_candidates
+                    )
+                top_score = max((score for _, score in candidates), default=None)
                 
-                # Direct retrieval to get context first
-                retriever = vector_store.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={"k": 5}
-                )
+                # Keep only relevant documents; skip the model entirely if there are none
+                selected = self._select_relevant(candidates)
+                if not selected:
+                    return self._no_relevant_context_response(len(candidates), top_score)
                 
-                # Get relevant documents
-                retrieved_docs = retriever.invoke(question)
+                retrieved_docs = [doc for doc, _ in selected]
                 
                 # Format context from retrieved documents
-                contexts = []
-                for i, doc in enumerate(retrieved_docs):
-                    source_info = f"Source: {doc.metadata.get('document_type', 'Unknown')} - {doc.metadata.get('filename', 'Unknown')}"
-                    if 'page' in doc.metadata:
-                        source_info += f", Page {doc.metadata['page']}"
-                    
-                    contexts.append(f"[Document {i+1}] {source_info}\n{doc.page_content}\n")
-                
-                context_text = "\n\n".join(contexts)
+                context_text = self._format_context(retrieved_docs)
                 
                 # Generate the response
-                response = self.llm.invoke(
-                    prompt.format(
-                        class_name=class_name,
-                        context=context_text
-                    )
+                response = self._invoke_llm(
+                    admission_key or class_name,
+                    self._build_messages(class_name, context_text, question, chat_history)
                 )
                 
                 # Format sources
-                sources = []
-                for doc in retrieved_docs:
-                    source = {
-                        "filename": doc.metadata.get("filename", "Unknown"),
-                        "document_type": doc.metadata.get("document_type", "Unknown"),
-                        "page": doc.metadata.get("page", "Unknown"),
-                        "snippet": doc.page_content[:150] + "..." if len(doc.page_content) > 150 else doc.page_content
-                    }
-                    sources.append(source)
+                sources = self._format_sources(retrieved_docs)
                 
                 return {
                     "answer": response.content,
                     "sources": sources,
                     "tokens_used": cb.total_tokens,
-                    "cost": cb.total_cost
+                    "prompt_tokens": cb.prompt_tokens,
+                    "completion_tokens": cb.completion_tokens,
+                    "cached_tokens": getattr(cb, "prompt_tokens_cached", 0),
+                    "cost": cb.total_cost,
+                    "retrieval": {"candidates": len(candidates), "kept": len(selected), "top_score": top_score}
+                }
+                
+        except AdmissionRejected:
+            # Let the caller turn this into a 429/503 with a retry hint
+            raise
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return {
+                "answer": f"Sorry, I encountered an error while generating a response: {str(e)}",
+                "sources": [],
+                "tokens_used": 0,
+                "cost": 0.0,
+                "error": str(e)
+            }
+    
+    def _merge_class_results(
+        self,
+        results: Dict[str, Tuple[List[Any], List[float]]],
+        k: int,
+        per_class_k: int
+    ) -> List[Tuple[Any, float]]:
+        """
+        Merge per-class retrieval results by relevance score.
+        
+        Each class's best hit is kept first so no class is crowded out, then the
+        remaining slots are filled by score, with at most per_class_k hits per class.
+        """
+        ranked = {
+            class_name: sorted(zip(docs, scores), key=lambda pair: pair[1], reverse=True)[:per_class_k]
+            for class_name, (docs, scores) in results.items()
+        }
+        
+        selected = [hits[0] for hits in ranked.values() if hits][:k]
+        remaining = sorted(
+            (hit for hits in ranked.values() for hit in hits[1:]),
+            key=lambda pair: pair[1],
+            reverse=True
+        )
+        selected.extend(remaining[:max(0, k - len(selected))])
+        selected.sort(key=lambda pair: pair[1], reverse=True)
+        
+        return selected
+    
+    def generate_multi_class_response(
+        self,
+        class_names: List[str],
+        question: str,
+        chat_history: Optional[List[Tuple[str, str]]] = None,
+        k: Optional[int] = None,
+        per_class_k: Optional[int] = None,
+        usage_source: str = "chat"
+    ) -> Dict[str, Any]:
+        """
+        Generate a response using materials from several classes.
+        
+        The question is embedded once and the class collections are searched
+        concurrently, so latency stays close to a single-class query.
+        
+        Args:
+            class_names: Names of the classes to search
+            question: User's question
+            chat_history: List of (question, answer) tuples from previous conversation
+            k: Maximum number of documents to use as context (optional)
+            per_class_k: Maximum number of documents from any one class (optional)
+            usage_source: Label recorded in the usage ledger (e.g., 'chat', 'batch')
+            
+        Returns:
+            Dictionary with response and metadata
+        """
+        # Remove duplicates while keeping order
+        class_names = list(dict.fromkeys(class_names))
+        
+        if len(class_names) == 1:
+            return self.generate_response(class_names[0], question, chat_history, usage_source=usage_source)
+        
+        start_time = time.monotonic()
+        usage_class = "+".join(get_collection_name(name) for name in class_names)
+        try:
+            response = self._generate_multi_class_response(class_names, question, chat_history, k, per_class_k)
+        except AdmissionRejected as e:
+            self._record_usage(usage_source, usage_class, question, {"error": f"admission_rejected_{e.status_code}"}, start_time)
+            raise
+        
+        self._record_usage(usage_source, usage_class, question, response, start_time)
+        return response
+    
+    def _generate_multi_class_response(
+        self,
+        class_names: List[str],
+        question: str,
+        chat_history: Optional[List[Tuple[str, str]]],
+        k: Optional[int],
+        per_class_k: Optional[int]
+    ) -> Dict[str, Any]:
+        k = k or self.retrieval_max_k
+        per_class_k = per_class_k or max(1, math.ceil(2 * k / len(class_names)))
+        candidates_per_class = max(per_class_k, math.ceil(self.retrieval_candidates / len(class_names)))
+        
+        try:
+            # Track token usage and cost
+            with get_openai_callback() as cb:
+                # Embed the question once per embedding model and search every class in parallel
+                class_embeddings = {
+                    class_name: self.vector_store_manager.get_class_embeddings(class_name) for class_name in class_names
+                }
+                query_embeddings = {}
+                for embeddings in class_embeddings.values():
+                    if embeddings not in query_embeddings:
+                        query_embeddings[embeddings] = embeddings.embed_query(question)
+                futures = {
+                    class_name: self.retrieval_executor.submit(
+                        self.vector_store_manager.query_vector_store_by_vector,
+                        class_name,
+                        query_embeddings[class_embeddings[class_name]],
+                        candidates_per_class
+                    )
+                    for class_name in class_names
+                }
+                results = {class_name: future.result() for class_name, future in futures.items()}
+                
+                found_classes = [class_name for class_name, (docs, _) in results.items() if docs]
+                if not found_classes:
+                    return {
+                        "answer": f"Sorry, I couldn't find any information for the classes: {', '.join(class_names)}. Please make sure the classes exist and have been properly added to the system.",
+                        "sources": [],
+                        "tokens_used": 0,
+                        "cost": 0.0
+                    }
+                
+                # Apply the same relevance policy to the merged hits
+                candidates = [
+                    (doc, score) for docs, scores in results.values() for doc, score in zip(docs, scores)
+                ]
+                top_score = max((score for _, score in candidates), default=None)
+                cutoff = self._relevance_cutoff([score for _, score in candidates])
+                if cutoff is None:
+                    return self._no_relevant_context_response(len(candidates), top_score)
+                
+                relevant_results = {
+                    class_name: (
+                        [doc for doc, score in zip(docs, scores) if score >= cutoff],
+                        [score for score in scores if score >= cutoff]
+                    )
+                    for class_name, (docs, scores) in results.items()
+                }
+                selected = self._merge_class_results(relevant_results, k, per_class_k)
+                
+                retrieved_docs = [doc for doc, _ in selected]
+                
+                # Format context from retrieved documents, labelled by class
+                context_text = self._format_context(retrieved_docs, include_class=True)
+                
+                # Generate the response
+                response = self._invoke_llm(
+                    found_classes[0],
+                    self._build_messages(", ".join(found_classes), context_text, question, chat_history)
+                )
+                
+                return {
+                    "answer": response.content,
+                    "sources": self._format_sources(retrieved_docs),
+                    "classes": found_classes,
+                    "tokens_used": cb.total_tokens,
+                    "prompt_tokens": cb.prompt_tokens,
+                    "completion_tokens": cb.completion_tokens,
+                    "cached_tokens": getattr(cb, "prompt_tokens_cached", 0),
+                    "cost": cb.total_cost,
+                    "retrieval": {"candidates": len(candidates), "kept": len(selected), "top_score": top_score}
                 }
                 
+        except AdmissionRejected:
+            # Let the caller turn this into a 429/503 with a retry hint
+            raise
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -173,7 +569,8 @@ class CourseAssistantChatbot:
                 "answer": f"Sorry, I encountered an error while generating a response: {str(e)}",
                 "sources": [],
                 "tokens_used": 0,
-                "cost": 0.0
+                "cost": 0.0,
+                "error": str(e)
             }
     
     def reset_conversation(self, class_name: str) -> bool:
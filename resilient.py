@@ -0,0 +1,292 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Any, List, Optional, Tuple, Type
+import openai
+from langchain_core.embeddings import Embeddings
+
+
+class CallTimeout(Exception):
+    """Raised when a call doesn't complete before its deadline."""
+
+
+# Errors worth retrying: network failures, timeouts, rate limits and 5xx responses
+RETRYABLE_ERRORS: Tuple[Type[BaseException], ...] = (
+    CallTimeout,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class CallMetrics:
+    def __init__(self, window: int = 500):
+        """
+        Initialize call metrics.
+
+        Args:
+            window: Number of recent successful call latencies to keep
+        """
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Get a latency percentile in seconds, or None if there are no samples."""
+        with self._lock:
+            if not self._latencies:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self._latencies)
+
+    def to_dict(self) -> Dict[str, Any]:
+        p50, p95, p99 = (self.percentile(p) for p in (50, 95, 99))
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "successes": self.successes,
+                "failures": self.failures,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+                "latency_p50": p50,
+                "latency_p95": p95,
+                "latency_p99": p99
+            }
+
+
+# Worker threads per caller; abandoned attempts finish in the background
+RESILIENT_MAX_WORKERS = int(os.getenv("RESILIENT_MAX_WORKERS", "32"))
+
+
+class ResilientCaller:
+    def __init__(
+        self,
+        name: str,
+        attempt_timeout: float = 30.0,
+        total_timeout: float = 60.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        hedge_percentile: Optional[float] = 95.0,
+        hedge_min_samples: int = 20,
+        retryable_errors: Tuple[Type[BaseException], ...] = RETRYABLE_ERRORS,
+        max_workers: int = RESILIENT_MAX_WORKERS
+    ):
+        """
+        Initialize a caller with deadlines, jittered retries and hedged requests.
+
+        Args:
+            name: Name used in metrics
+            attempt_timeout: Seconds allowed for a single attempt
+            total_timeout: Seconds allowed for the call including retries
+            max_retries: Maximum number of retries after the first attempt
+            backoff_base: Base delay in seconds for exponential backoff
+            backoff_max: Maximum backoff delay in seconds
+            hedge_percentile: Latency percentile after which a duplicate request is sent (None disables hedging)
+            hedge_min_samples: Number of latency samples needed before hedging starts
+            retryable_errors: Exception types that trigger a retry
+            max_workers: Threads running this caller's attempts; each caller has its own
+                pool, so long ingestion calls can't hold up interactive ones
+        """
+        self.name = name
+        self.attempt_timeout = attempt_timeout
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.retryable_errors = retryable_errors
+        self.metrics = CallMetrics()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix=f"resilient-{name}")
+
+    def _submit(self, fn: Callable, args: tuple, kwargs: dict) -> Tuple[Future, threading.Event, List[float]]:
+        # Copy context so callbacks such as get_openai_callback still see this request
+        context = contextvars.copy_context()
+        started = threading.Event()
+        started_at: List[float] = []
+
+        def run():
+            # Time spent waiting for a worker isn't part of the attempt
+            start_time = time.monotonic()
+            started_at.append(start_time)
+            started.set()
+            result = context.run(fn, *args, **kwargs)
+            self.metrics.record_latency(time.monotonic() - start_time)
+            return result
+
+        return self._executor.submit(run), started, started_at
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile is None or self.metrics.sample_count() < self.hedge_min_samples:
+            return None
+        return self.metrics.percentile(self.hedge_percentile)
+
+    def _attempt(self, fn: Callable, args: tuple, kwargs: dict, timeout: float, call_deadline: float) -> Any:
+        primary, started, started_at = self._submit(fn, args, kwargs)
+
+        # Waiting for a free worker only counts against the overall deadline
+        if not started.wait(max(0.0, call_deadline - time.monotonic())):
+            primary.cancel()
+            self.metrics.increment("timeouts")
+            raise CallTimeout(f"{self.name} call wasn't started before its deadline")
+
+        deadline = min(call_deadline, started_at[0] + timeout)
+        pending = {primary}
+
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait(pending, timeout=max(0.0, min(started_at[0] + hedge_delay, deadline) - time.monotonic()))
+            if not done:
+                # Primary is slower than usual; race a duplicate request against it
+                self.metrics.increment("hedges_fired")
+                pending.add(self._submit(fn, args, kwargs)[0])
+
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+
+            if not done:
+                break
+
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self.metrics.increment("hedges_won")
+                    return future.result()
+                last_error = future.exception()
+
+        if last_error is not None and not pending:
+            raise last_error
+
+        self.metrics.increment("timeouts")
+        raise CallTimeout(f"{self.name} call timed out after {deadline - started_at[0]:.1f}s")
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Call a function with per-attempt deadlines, retries and hedging.
+
+        Args:
+            fn: Function to call
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            The function's result
+        """
+        self.metrics.increment("calls")
+        deadline = time.monotonic() + self.total_timeout
+        attempt = 0
+
+        while True:
+            try:
+                result = self._attempt(fn, args, kwargs, self.attempt_timeout, deadline)
+                self.metrics.increment("successes")
+                return result
+            except self.retryable_errors as e:
+                # Full jitter keeps retries from many requests from synchronizing
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    self.metrics.increment("failures")
+                    raise
+
+                print(f"{self.name} call failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s")
+                self.metrics.increment("retries")
+                attempt += 1
+                time.sleep(delay)
+            except Exception:
+                self.metrics.increment("failures")
+                raise
+
+
+_callers: Dict[str, ResilientCaller] = {}
+_callers_lock = threading.Lock()
+
+
+def get_caller(name: str, **overrides) -> ResilientCaller:
+    """
+    Get a shared resilient caller by name, configured from environment variables.
+
+    Environment variables: OPENAI_ATTEMPT_TIMEOUT, OPENAI_TOTAL_TIMEOUT,
+    OPENAI_MAX_RETRIES and OPENAI_HEDGE_PERCENTILE (0 disables hedging).
+
+    Args:
+        name: Name of the caller (e.g., 'chat', 'embeddings_query')
+        **overrides: Constructor arguments overriding the environment defaults
+
+    Returns:
+        Shared ResilientCaller instance
+    """
+    with _callers_lock:
+        if name not in _callers:
+            hedge_percentile = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))
+            settings = {
+                "attempt_timeout": float(os.getenv("OPENAI_ATTEMPT_TIMEOUT", "30")),
+                "total_timeout": float(os.getenv("OPENAI_TOTAL_TIMEOUT", "60")),
+                "max_retries": int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+                "hedge_percentile": hedge_percentile or None
+            }
+            settings.update(overrides)
+            _callers[name] = ResilientCaller(name, **settings)
+        return _callers[name]
+
+
+def get_all_metrics() -> Dict[str, Dict[str, Any]]:
+    """Get metrics for every shared caller."""
+    with _callers_lock:
+        callers = dict(_callers)
+    return {name: caller.metrics.to_dict() for name, caller in callers.items()}
+
+
+class ResilientEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings):
+        """
+        Wrap an embeddings model with deadlines, retries and hedging.
+
+        Query embeddings are on the request path and are hedged. Document
+        embeddings are large ingestion batches, so they are only retried.
+
+        Args:
+            embeddings: Underlying LangChain embeddings model
+        """
+        self.embeddings = embeddings
+        self.query_caller = get_caller("embeddings_query", attempt_timeout=10.0, total_timeout=30.0)
+        self.documents_caller = get_caller(
+            "embeddings_documents",
+            attempt_timeout=120.0,
+            total_timeout=600.0,
+            max_retries=4,
+            hedge_percentile=None
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.documents_caller.call(self.embeddings.embed_documents, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.query_caller.call(self.embeddings.embed_query, text)
@@ -0,0 +1,41 @@
+import os
+from typing import Optional
+
+
+def get_data_root(fallback: Optional[str] = None) -> str:
+    """
+    Get the root directory for persistent data, preferring the Railway volume.
+
+    Args:
+        fallback: Directory to use when no Railway volume is mounted (optional)
+
+    Returns:
+        Path to the data root directory
+    """
+    railway_volume_path = os.environ.get("RAILWAY_VOLUME_MOUNT_PATH")
+
+    if railway_volume_path and os.path.exists(railway_volume_path):
+        return railway_volume_path
+
+    return fallback or os.getcwd()
+
+
+def get_data_dir(name: str, fallback: Optional[str] = None) -> str:
+    """
+    Get (and create) a named directory under the data root.
+
+    Args:
+        name: Name of the directory (e.g., 'uploads')
+        fallback: Data root to use when no Railway volume is mounted (optional)
+
+    Returns:
+        Path to the directory
+    """
+    path = os.path.join(get_data_root(fallback), name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_collection_name(class_name: str) -> str:
+    """Get the sanitized collection name for a class."""
+    return class_name.replace(" ", "_").lower()
@@ -0,0 +1,426 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+from typing import Dict, Any, List, Optional, Set
+
+from storage import get_data_dir, get_collection_name
+from class_manifest import get_manifest_path, load_class_manifest, save_class_manifest
+from faq_cache import get_faq_path
+from page_cache import PageTextCache
+from class_snapshot import SnapshotError, export_class_snapshot, import_class_snapshot
+
+# Chroma keeps each HNSW index in a directory named after its segment UUID
+SEGMENT_DIR_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+SQLITE_FILE = "chroma.sqlite3"
+
+
+def get_path_size(path: str) -> int:
+    """Get the total size in bytes of a file or directory tree."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _last_modified(path: str) -> float:
+    latest = os.path.getmtime(path)
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                pass
+    return latest
+
+
+def _read_sqlite(sqlite_path: str, query: str) -> List[tuple]:
+    # Read-only so maintenance reports never take write locks
+    connection = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True)
+    try:
+        return connection.execute(query).fetchall()
+    finally:
+        connection.close()
+
+
+class StorageMaintenance:
+    def __init__(
+        self,
+        vector_store_manager: Any,
+        upload_folder: Optional[str] = None,
+        min_orphan_age_hours: float = 1.0,
+        stale_upload_hours: float = 24.0
+    ):
+        """
+        Initialize storage maintenance for the data volume.
+
+        Args:
+            vector_store_manager: VectorStoreManager whose collections are maintained
+            upload_folder: Folder used by the chunked upload manager (optional)
+            min_orphan_age_hours: Leave directories modified more recently than this alone,
+                so classes that are still being ingested aren't removed
+            stale_upload_hours: Age after which upload sessions and staged files are removed
+        """
+        self.vector_store_manager = vector_store_manager
+        self.base_persist_directory = vector_store_manager.base_persist_directory
+        self.upload_folder = upload_folder or get_data_dir("uploads")
+        self.min_orphan_age = min_orphan_age_hours * 3600
+        self.stale_upload_age = stale_upload_hours * 3600
+
+    def _collection_dirs(self) -> List[str]:
+        if not os.path.exists(self.base_persist_directory):
+            return []
+        return sorted(
+            d for d in os.listdir(self.base_persist_directory)
+            if os.path.isdir(os.path.join(self.base_persist_directory, d))
+        )
+
+    def _live_segment_ids(self, collection_path: str) -> Optional[Set[str]]:
+        sqlite_path = os.path.join(collection_path, SQLITE_FILE)
+        if not os.path.exists(sqlite_path):
+            return None
+        try:
+            return {row[0] for row in _read_sqlite(sqlite_path, "SELECT id FROM segments")}
+        except sqlite3.Error as e:
+            print(f"Could not read segments from {sqlite_path}: {e}")
+            return None
+
+    def _embedding_count(self, collection_path: str) -> Optional[int]:
+        sqlite_path = os.path.join(collection_path, SQLITE_FILE)
+        if not os.path.exists(sqlite_path):
+            return None
+        try:
+            return _read_sqlite(sqlite_path, "SELECT COUNT(*) FROM embeddings")[0][0]
+        except sqlite3.Error:
+            return None
+
+    def get_disk_usage(self) -> Dict[str, Any]:
+        """
+        Report disk usage per class and for each data directory.
+
+        Returns:
+            Dictionary with per-class usage, data directory sizes and the total
+        """
+        classes = []
+        for collection_name in self._collection_dirs():
+            collection_path = os.path.join(self.base_persist_directory, collection_name)
+            sqlite_path = os.path.join(collection_path, SQLITE_FILE)
+            live_segments = self._live_segment_ids(collection_path) or set()
+
+            sqlite_bytes = os.path.getsize(sqlite_path) if os.path.exists(sqlite_path) else 0
+            sqlite_free_bytes = 0
+            if sqlite_bytes:
+                try:
+                    page_size = _read_sqlite(sqlite_path, "PRAGMA page_size")[0][0]
+                    free_pages = _read_sqlite(sqlite_path, "PRAGMA freelist_count")[0][0]
+                    sqlite_free_bytes = page_size * free_pages
+                except sqlite3.Error:
+                    pass
+
+            index_bytes = 0
+            orphan_segment_bytes = 0
+            for entry in os.listdir(collection_path):
+                entry_path = os.path.join(collection_path, entry)
+                if os.path.isdir(entry_path) and SEGMENT_DIR_PATTERN.match(entry):
+                    if entry in live_segments:
+                        index_bytes += get_path_size(entry_path)
+                    else:
+                        orphan_segment_bytes += get_path_size(entry_path)
+
+            chunk_count = self._embedding_count(collection_path)
+            classes.append({
+                "collection_name": collection_name,
+                "chunk_count": chunk_count,
+                "total_bytes": get_path_size(collection_path),
+                "sqlite_bytes": sqlite_bytes,
+                "sqlite_free_bytes": sqlite_free_bytes,
+                "index_bytes": index_bytes,
+                "index_bytes_per_chunk": round(index_bytes / chunk_count) if chunk_count else None,
+                "orphan_segment_bytes": orphan_segment_bytes
+            })
+
+        data_dirs = {"chroma_db": get_path_size(self.base_persist_directory)}
+        for name in ("page_cache", "class_manifests", "faq_cache"):
+            data_dirs[name] = get_path_size(get_data_dir(name))
+        data_dirs["uploads"] = get_path_size(self.upload_folder)
+
+        return {
+            "classes": classes,
+            "data_dirs": data_dirs,
+            "total_bytes": sum(data_dirs.values())
+        }
+
+    def find_orphans(self) -> Dict[str, List[str]]:
+        """
+        Find storage no longer referenced by any class.
+
+        Returns:
+            Dictionary of orphaned paths by kind
+        """
+        now = time.time()
+        orphans: Dict[str, List[str]] = {
+            "collection_dirs": [],
+            "segment_dirs": [],
+            "manifests": [],
+            "faq_caches": [],
+            "upload_sessions": [],
+            "staged_uploads": [],
+            "page_cache_files": []
+        }
+
+        live_collections = set()
+        for collection_name in self._collection_dirs():
+            collection_path = os.path.join(self.base_persist_directory, collection_name)
+            recently_modified = now - _last_modified(collection_path) < self.min_orphan_age
+
+            # Directories list_available_classes skips, or half-built ones with no chunks
+            is_chroma_dir = any(os.path.exists(os.path.join(collection_path, name)) for name in (SQLITE_FILE, "index"))
+            chunk_count = self._embedding_count(collection_path) if is_chroma_dir else None
+            if not is_chroma_dir or chunk_count == 0:
+                if not recently_modified:
+                    orphans["collection_dirs"].append(collection_path)
+                continue
+
+            live_collections.add(collection_name)
+
+            # A locked or busy database can't be checked; keep the class and everything it uses
+            if chunk_count is None:
+                print(f"Skipping orphan check for {collection_path}: chunk count unavailable")
+                continue
+
+            # HNSW directories left behind when a collection was deleted and recreated
+            live_segments = self._live_segment_ids(collection_path) or set()
+            for entry in os.listdir(collection_path):
+                entry_path = os.path.join(collection_path, entry)
+                if (os.path.isdir(entry_path) and SEGMENT_DIR_PATTERN.match(entry) and
+                        entry not in live_segments and now - _last_modified(entry_path) >= self.min_orphan_age):
+                    orphans["segment_dirs"].append(entry_path)
+
+        # Per-class files whose collection is gone
+        referenced_page_files = set()
+        page_cache = PageTextCache()
+        for kind, directory, path_for in (
+            ("manifests", get_data_dir("class_manifests"), get_manifest_path),
+            ("faq_caches", get_data_dir("faq_cache"), get_faq_path)
+        ):
+            for file_name in sorted(os.listdir(directory)):
+                if not file_name.endswith(".json"):
+                    continue
+                collection_name = file_name[:-len(".json")]
+                if collection_name not in live_collections:
+                    orphans[kind].append(os.path.join(directory, file_name))
+                elif kind == "manifests":
+                    for source in load_class_manifest(collection_name).get("sources", []):
+                        referenced_page_files.add(page_cache.get_cache_path(source["file_hash"]))
+
+        # Cached page text not used by any remaining class
+        for root, _, files in os.walk(page_cache.cache_directory):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                if path not in referenced_page_files and now - os.path.getmtime(path) >= self.min_orphan_age:
+                    orphans["page_cache_files"].append(path)
+
+        # Abandoned or finished chunked uploads
+        sessions_directory = os.path.join(self.upload_folder, "sessions")
+        staged_directory = os.path.join(self.upload_folder, "staged")
+        for directory, kind in ((sessions_directory, "upload_sessions"), (staged_directory, "staged_uploads")):
+            if not os.path.isdir(directory):
+                continue
+            for entry in sorted(os.listdir(directory)):
+                path = os.path.join(directory, entry)
+                if now - _last_modified(path) >= self.stale_upload_age:
+                    orphans[kind].append(path)
+
+        return orphans
+
+    def remove_orphans(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Remove storage no longer referenced by any class.
+
+        Args:
+            dry_run: Only report what would be removed
+
+        Returns:
+            Removed paths by kind and the number of bytes freed
+        """
+        orphans = self.find_orphans()
+        bytes_freed = 0
+
+        for paths in orphans.values():
+            for path in paths:
+                bytes_freed += get_path_size(path)
+                if dry_run:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif os.path.exists(path):
+                    os.remove(path)
+
+        if not dry_run:
+            print(f"Removed {sum(len(p) for p in orphans.values())} orphaned paths, freed {bytes_freed} bytes")
+
+        return {"dry_run": dry_run, "removed": orphans, "bytes_freed": bytes_freed}
+
+    def vacuum_class(self, class_name: str) -> Dict[str, Any]:
+        """
+        Compact a class's sqlite file, returning free pages to the volume.
+
+        Args:
+            class_name: Name of the class
+
+        Returns:
+            Dictionary with the sqlite size before and after
+        """
+        sqlite_path = os.path.join(self.vector_store_manager.get_collection_path(class_name), SQLITE_FILE)
+        if not os.path.exists(sqlite_path):
+            return {"class_name": class_name, "error": "Class not found"}
+
+        size_before = os.path.getsize(sqlite_path)
+        connection = sqlite3.connect(sqlite_path, timeout=60)
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+        size_after = os.path.getsize(sqlite_path)
+
+        print(f"Vacuumed '{class_name}': {size_before} -> {size_after} bytes")
+        return {"class_name": class_name, "sqlite_bytes_before": size_before, "sqlite_bytes_after": size_after}
+
+    def rebuild_index(self, class_name: str) -> Dict[str, Any]:
+        """
+        Rebuild a class's HNSW index by re-adding its stored vectors to a fresh collection.
+
+        Deleted elements are dropped from the new index, so it is smaller and
+        loads faster. No embedding calls are made. The class keeps serving its
+        old index until the new one has loaded.
+
+        Args:
+            class_name: Name of the class
+
+        Returns:
+            Dictionary with the collection size before and after
+        """
+        collection_path = self.vector_store_manager.get_collection_path(class_name)
+        if not os.path.exists(collection_path):
+            return {"class_name": class_name, "error": "Class not found"}
+
+        size_before = get_path_size(collection_path)
+        class_manifest = load_class_manifest(class_name)
+
+        # Round-trip through a snapshot so the stored vectors are reused as-is
+        fd, snapshot_path = tempfile.mkstemp(suffix=".zip", dir=self.upload_folder)
+        os.close(fd)
+        try:
+            export_class_snapshot(self.vector_store_manager, class_name, snapshot_path, include_pages=False)
+            import_class_snapshot(self.vector_store_manager, snapshot_path, class_name=class_name, overwrite=True)
+        except SnapshotError as e:
+            return {"class_name": class_name, "error": str(e)}
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+
+        # Keep the original build manifest rather than marking the class as imported
+        if class_manifest:
+            save_class_manifest(class_name, class_manifest)
+
+        # Drop the old index directory and the space the old rows used
+        live_segments = self._live_segment_ids(collection_path) or set()
+        for entry in os.listdir(collection_path):
+            entry_path = os.path.join(collection_path, entry)
+            if os.path.isdir(entry_path) and SEGMENT_DIR_PATTERN.match(entry) and entry not in live_segments:
+                shutil.rmtree(entry_path, ignore_errors=True)
+        self.vacuum_class(class_name)
+
+        size_after = get_path_size(collection_path)
+        print(f"Rebuilt index for '{class_name}': {size_before} -> {size_after} bytes")
+        return {"class_name": class_name, "bytes_before": size_before, "bytes_after": size_after}
+
+    def run(
+        self,
+        vacuum: bool = True,
+        remove_orphans: bool = True,
+        rebuild_classes: Optional[List[str]] = None,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Run a maintenance pass.
+
+        Args:
+            vacuum: Whether to vacuum every class's sqlite file
+            remove_orphans: Whether to remove orphaned storage
+            rebuild_classes: Classes whose HNSW index should be rebuilt (optional)
+            dry_run: Only report what would change
+
+        Returns:
+            Summary of the pass, with disk usage before and after
+        """
+        usage_before = self.get_disk_usage()
+        result: Dict[str, Any] = {"dry_run": dry_run, "total_bytes_before": usage_before["total_bytes"]}
+
+        if remove_orphans:
+            result["orphans"] = self.remove_orphans(dry_run=dry_run)
+
+        if dry_run:
+            result["usage"] = usage_before
+            return result
+
+        result["rebuilt"] = [self.rebuild_index(class_name) for class_name in rebuild_classes or []]
+
+        if vacuum:
+            rebuilt = {get_collection_name(class_name) for class_name in rebuild_classes or []}
+            result["vacuumed"] = [
+                self.vacuum_class(entry["collection_name"])
+                for entry in self.get_disk_usage()["classes"]
+                if entry["collection_name"] not in rebuilt
+            ]
+
+        result["usage"] = self.get_disk_usage()
+        result["total_bytes_after"] = result["usage"]["total_bytes"]
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report and reclaim disk usage on the data volume.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("report", help="Show disk usage per class and orphaned storage")
+
+    clean_parser = subparsers.add_parser("clean", help="Remove orphans and vacuum every class")
+    clean_parser.add_argument("--dry-run", action="store_true", help="Only show what would be removed")
+    clean_parser.add_argument("--no-vacuum", action="store_true", help="Skip vacuuming sqlite files")
+    clean_parser.add_argument("--rebuild", nargs="*", default=[], metavar="CLASS",
+                              help="Also rebuild the HNSW index of these classes")
+
+    args = parser.parse_args()
+
+    from vector_store import VectorStoreManager
+    maintenance = StorageMaintenance(VectorStoreManager())
+
+    if args.command == "report":
+        result = {"usage": maintenance.get_disk_usage(), "orphans": maintenance.find_orphans()}
+    else:
+        result = maintenance.run(
+            vacuum=not args.no_vacuum,
+            rebuild_classes=args.rebuild,
+            dry_run=args.dry_run
+        )
+
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
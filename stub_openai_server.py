@@ -0,0 +1,232 @@
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List
+
+# Point the app at this server with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+
+
+class StubSettings:
+    def __init__(
+        self,
+        latency_ms: float = 50.0,
+        jitter_ms: float = 20.0,
+        slow_fraction: float = 0.0,
+        slow_ms: float = 2000.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        dimensions: int = 1536,
+        answer: str = "This is a stub answer based on the course materials."
+    ):
+        """
+        Initialize stub server behaviour.
+
+        Args:
+            latency_ms: Base response latency in milliseconds
+            jitter_ms: Random extra latency in milliseconds
+            slow_fraction: Fraction of requests that take slow_ms instead
+            slow_ms: Latency of slow requests in milliseconds
+            error_rate: Fraction of requests that fail with HTTP 500
+            rate_limit_rate: Fraction of requests that fail with HTTP 429
+            dimensions: Size of returned embedding vectors
+            answer: Content of chat completion responses
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_fraction = slow_fraction
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.dimensions = dimensions
+        self.answer = answer
+
+        self.lock = threading.Lock()
+        self.counts = {"chat": 0, "embeddings": 0, "errors": 0, "rate_limited": 0}
+        # Hashes of message prefixes seen so far, for reporting cached prompt tokens
+        self.seen_prefixes = set()
+
+
+def _fake_embedding(text: str, dimensions: int) -> List[float]:
+    # Deterministic so the same text always maps to the same vector
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+def _cached_prompt_tokens(settings: StubSettings, messages: List[Dict[str, Any]]) -> int:
+    # Like the real prompt cache, count the leading messages already sent in an earlier request
+    digest = hashlib.sha256()
+    cached, prefix_tokens, matching = 0, 0, True
+    with settings.lock:
+        for message in messages:
+            digest.update(json.dumps(message, sort_keys=True).encode("utf-8"))
+            prefix_tokens += len(str(message.get("content", "")).split())
+            key = digest.hexdigest()
+            if matching and key in settings.seen_prefixes:
+                cached = prefix_tokens
+            else:
+                matching = False
+                settings.seen_prefixes.add(key)
+    return cached
+
+
+def make_handler(settings: StubSettings):
+    class StubOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _inject_latency_and_errors(self) -> bool:
+            if random.random() < settings.slow_fraction:
+                delay_ms = settings.slow_ms
+            else:
+                delay_ms = settings.latency_ms + random.uniform(0, settings.jitter_ms)
+            time.sleep(delay_ms / 1000)
+
+            roll = random.random()
+            if roll < settings.error_rate:
+                with settings.lock:
+                    settings.counts["errors"] += 1
+                self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+                return True
+            if roll < settings.error_rate + settings.rate_limit_rate:
+                with settings.lock:
+                    settings.counts["rate_limited"] += 1
+                self._send_json(429, {"error": {"message": "Injected rate limit", "type": "rate_limit_error"}},
+                                {"Retry-After": "1"})
+                return True
+            return False
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with settings.lock:
+                    self._send_json(200, dict(settings.counts))
+                return
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            path = self.path.rstrip("/")
+
+            if path.endswith("/embeddings"):
+                if self._inject_latency_and_errors():
+                    return
+                inputs = request.get("input", [])
+                if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                    inputs = [inputs]
+                with settings.lock:
+                    settings.counts["embeddings"] += 1
+                dimensions = request.get("dimensions") or settings.dimensions
+                data = [
+                    {"object": "embedding", "index": i, "embedding": _fake_embedding(str(text), dimensions)}
+                    for i, text in enumerate(inputs)
+                ]
+                tokens = sum(len(t) if isinstance(t, list) else len(str(t).split()) for t in inputs)
+                self._send_json(200, {
+                    "object": "list",
+                    "data": data,
+                    "model": request.get("model", "stub-embedding"),
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+                })
+                return
+
+            if path.endswith("/chat/completions"):
+                if self._inject_latency_and_errors():
+                    return
+                with settings.lock:
+                    settings.counts["chat"] += 1
+                prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+                completion_tokens = len(settings.answer.split())
+                cached_tokens = _cached_prompt_tokens(settings, request.get("messages", []))
+                self._send_json(200, {
+                    "id": f"chatcmpl-stub-{random.randint(0, 1 << 30)}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "stub-chat"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": settings.answer},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                        "prompt_tokens_details": {"cached_tokens": cached_tokens}
+                    }
+                })
+                return
+
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    return StubOpenAIHandler
+
+
+def start_stub_server(settings: StubSettings, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the stub server in a background thread.
+
+    Args:
+        settings: Latency and error injection settings
+        host: Host to bind to
+        port: Port to bind to (0 picks a free port)
+
+    Returns:
+        The running server; its base URL is http://host:server.server_port/v1
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(settings))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI chat and embeddings server with injected latency and errors.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=2000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    args = parser.parse_args()
+
+    settings = StubSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        slow_fraction=args.slow_fraction,
+        slow_ms=args.slow_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        dimensions=args.dimensions
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(settings))
+    print(f"Stub OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
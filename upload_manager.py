@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from typing import Dict, Any, Optional, BinaryIO
+from werkzeug.utils import secure_filename
+
+from storage import get_collection_name
+
+# Size of the buffer used when streaming request bodies and hashing files.
+# Memory use per upload stays at this size no matter how large the file is.
+STREAM_BUFFER_SIZE = 1024 * 1024  # 1 MB
+
+# Recommended chunk size for clients. Each chunk is a separate request, so
+# it has to stay below Flask's MAX_CONTENT_LENGTH.
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # 8 MB
+
+DOCUMENT_TYPES = ("textbook", "lecture_notes", "assignments")
+
+# Class snapshot bundles are too large for a single request, so they reuse chunked uploads
+SNAPSHOT_DOCUMENT_TYPE = "snapshot"
+
+
+class UploadError(Exception):
+    """Raised when an upload request cannot be applied."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ChunkedUploadManager:
+    def __init__(self, upload_folder: str):
+        """
+        Initialize the chunked upload manager.
+
+        Files are streamed in parts straight to disk under the upload folder,
+        so uploads can be resumed and are not limited by the request size cap.
+
+        Args:
+            upload_folder: Base directory for in-progress and staged uploads
+        """
+        self.sessions_directory = os.path.join(upload_folder, "sessions")
+        self.staged_directory = os.path.join(upload_folder, "staged")
+        os.makedirs(self.sessions_directory, exist_ok=True)
+        os.makedirs(self.staged_directory, exist_ok=True)
+
+        # Guards concurrent chunk writes to the same upload
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _get_lock(self, upload_id: str) -> threading.Lock:
+        with self._locks_guard:
+            if upload_id not in self._locks:
+                self._locks[upload_id] = threading.Lock()
+            return self._locks[upload_id]
+
+    def _session_dir(self, upload_id: str) -> str:
+        # Upload IDs are generated by us, reject anything else
+        if not upload_id or secure_filename(upload_id) != upload_id:
+            raise UploadError("Invalid upload ID", 400)
+        return os.path.join(self.sessions_directory, upload_id)
+
+    def _load_session(self, upload_id: str) -> Dict[str, Any]:
+        session_path = os.path.join(self._session_dir(upload_id), "session.json")
+
+        if not os.path.exists(session_path):
+            raise UploadError(f"Upload '{upload_id}' not found", 404)
+
+        with open(session_path, "r") as f:
+            return json.load(f)
+
+    def _save_session(self, upload_session: Dict[str, Any]) -> None:
+        session_dir = self._session_dir(upload_session["upload_id"])
+        tmp_path = os.path.join(session_dir, "session.json.tmp")
+
+        with open(tmp_path, "w") as f:
+            json.dump(upload_session, f)
+        os.replace(tmp_path, os.path.join(session_dir, "session.json"))
+
+    def get_staged_class_dir(self, class_name: str) -> str:
+        """Get the staging directory for a class's completed uploads."""
+        return os.path.join(self.staged_directory, get_collection_name(class_name))
+
+    def create_upload(
+        self,
+        filename: str,
+        total_size: int,
+        class_name: str,
+        document_type: str,
+        sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Start a new chunked upload.
+
+        Args:
+            filename: Original file name
+            total_size: Total size of the file in bytes
+            class_name: Name of the class the file belongs to
+            document_type: Type of document (e.g., 'textbook', 'lecture_notes')
+            sha256: Expected SHA-256 hex digest of the whole file (optional)
+
+        Returns:
+            Dictionary describing the upload session
+        """
+        safe_filename = secure_filename(filename or "")
+
+        if not safe_filename:
+            raise UploadError("A file name is required")
+        if document_type not in DOCUMENT_TYPES + (SNAPSHOT_DOCUMENT_TYPE,):
+            raise UploadError(f"Document type must be one of: {', '.join(DOCUMENT_TYPES + (SNAPSHOT_DOCUMENT_TYPE,))}")
+        if total_size is None or int(total_size) <= 0:
+            raise UploadError("File size must be greater than zero")
+
+        upload_id = uuid.uuid4().hex
+        session_dir = os.path.join(self.sessions_directory, upload_id)
+        os.makedirs(session_dir, exist_ok=True)
+
+        # Create the empty part file that chunks are written into
+        open(os.path.join(session_dir, "data.part"), "wb").close()
+
+        upload_session = {
+            "upload_id": upload_id,
+            "filename": safe_filename,
+            "class_name": class_name,
+            "document_type": document_type,
+            "total_size": int(total_size),
+            "expected_sha256": sha256.lower() if sha256 else None,
+            "received_bytes": 0,
+            "chunk_size": DEFAULT_CHUNK_SIZE,
+            "completed": False,
+            "created_at": time.time()
+        }
+        self._save_session(upload_session)
+
+        return upload_session
+
+    def get_upload_status(self, upload_id: str) -> Dict[str, Any]:
+        """
+        Get the status of an upload, used by clients to resume.
+
+        Args:
+            upload_id: ID of the upload
+
+        Returns:
+            Dictionary describing the upload session
+        """
+        return self._load_session(upload_id)
+
+    def write_chunk(
+        self,
+        upload_id: str,
+        offset: int,
+        stream: BinaryIO,
+        chunk_sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Stream a chunk of the file to disk at the given offset.
+
+        Re-sending a chunk at an offset before the current end of the file
+        (e.g., after a dropped connection) overwrites the data from that point.
+
+        Args:
+            upload_id: ID of the upload
+            offset: Byte offset of the chunk within the file
+            stream: Readable stream containing the chunk body
+            chunk_sha256: Expected SHA-256 hex digest of this chunk (optional)
+
+        Returns:
+            Updated upload session
+        """
+        with self._get_lock(upload_id):
+            upload_session = self._load_session(upload_id)
+
+            if upload_session["completed"]:
+                raise UploadError("Upload is already complete", 409)
+            if offset < 0 or offset > upload_session["received_bytes"]:
+                raise UploadError(
+                    f"Unexpected offset {offset}, expected at most {upload_session['received_bytes']}", 409
+                )
+
+            part_path = os.path.join(self._session_dir(upload_id), "data.part")
+            digest = hashlib.sha256()
+            written = 0
+
+            with open(part_path, "r+b") as f:
+                f.seek(offset)
+                f.truncate()
+
+                while True:
+                    buffer = stream.read(STREAM_BUFFER_SIZE)
+                    if not buffer:
+                        break
+
+                    written += len(buffer)
+                    if offset + written > upload_session["total_size"]:
+                        f.truncate(offset)
+                        raise UploadError("Chunk exceeds the declared file size", 413)
+
+                    digest.update(buffer)
+                    f.write(buffer)
+
+                if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+                    f.truncate(offset)
+                    raise UploadError("Chunk checksum mismatch", 422)
+
+            upload_session["received_bytes"] = offset + written
+            self._save_session(upload_session)
+
+            return upload_session
+
+    def complete_upload(self, upload_id: str) -> Dict[str, Any]:
+        """
+        Verify a finished upload and move it to the class staging directory.
+
+        Args:
+            upload_id: ID of the upload
+
+        Returns:
+            Upload session including the staged file path and its checksum
+        """
+        with self._get_lock(upload_id):
+            upload_session = self._load_session(upload_id)
+
+            if upload_session["completed"]:
+                return upload_session
+            if upload_session["received_bytes"] != upload_session["total_size"]:
+                raise UploadError(
+                    f"Upload incomplete: received {upload_session['received_bytes']} "
+                    f"of {upload_session['total_size']} bytes", 409
+                )
+
+            session_dir = self._session_dir(upload_id)
+            part_path = os.path.join(session_dir, "data.part")
+
+            # Hash the file in fixed-size blocks
+            digest = hashlib.sha256()
+            with open(part_path, "rb") as f:
+                for block in iter(lambda: f.read(STREAM_BUFFER_SIZE), b""):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+
+            if upload_session["expected_sha256"] and sha256 != upload_session["expected_sha256"]:
+                raise UploadError("File checksum mismatch", 422)
+
+            # Move the file into the class staging area
+            target_dir = os.path.join(
+                self.get_staged_class_dir(upload_session["class_name"]),
+                upload_session["document_type"]
+            )
+            os.makedirs(target_dir, exist_ok=True)
+            target_path = os.path.join(target_dir, upload_session["filename"])
+            os.replace(part_path, target_path)
+
+            upload_session.update({
+                "completed": True,
+                "sha256": sha256,
+                "path": target_path
+            })
+            self._save_session(upload_session)
+
+            return upload_session
+
+    def abort_upload(self, upload_id: str) -> bool:
+        """
+        Abort an upload and remove its data.
+
+        Args:
+            upload_id: ID of the upload
+
+        Returns:
+            True if successful, False otherwise
+        """
+        session_dir = self._session_dir(upload_id)
+
+        if not os.path.exists(session_dir):
+            return False
+
+        with self._get_lock(upload_id):
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+        return True
+
+    def get_staged_materials(self, class_name: str) -> Dict[str, Any]:
+        """
+        Get the staged files for a class in the shape expected by ingestion.
+
+        Args:
+            class_name: Name of the class
+
+        Returns:
+            Dictionary with textbook_path, lecture_notes_dir and assignments_dir
+        """
+        class_dir = self.get_staged_class_dir(class_name)
+
+        def pdfs_in(document_type: str) -> list:
+            directory = os.path.join(class_dir, document_type)
+            if not os.path.isdir(directory):
+                return []
+            return sorted(f for f in os.listdir(directory) if f.lower().endswith(".pdf"))
+
+        textbooks = pdfs_in("textbook")
+        lecture_notes = pdfs_in("lecture_notes")
+        assignments = pdfs_in("assignments")
+
+        return {
+            "textbook_path": os.path.join(class_dir, "textbook", textbooks[0]) if textbooks else None,
+            "lecture_notes_dir": os.path.join(class_dir, "lecture_notes") if lecture_notes else None,
+            "assignments_dir": os.path.join(class_dir, "assignments") if assignments else None
+        }
+
+    def clear_staged_materials(self, class_name: str) -> None:
+        """Remove the staged files for a class after ingestion."""
+        shutil.rmtree(self.get_staged_class_dir(class_name), ignore_errors=True)
@@ -0,0 +1,348 @@
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from storage import get_data_dir
+
+# Whether question text is stored with each event (needed for top-question reports)
+STORE_QUESTIONS = os.getenv("USAGE_LEDGER_STORE_QUESTIONS", "true").lower() in ("1", "true", "yes")
+MAX_QUESTION_LENGTH = 500
+
+EVENT_COLUMNS = (
+    "timestamp", "day", "source", "class_name", "model", "question",
+    "prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens", "cost", "latency_ms",
+    "cache_hit", "retrieval_candidates", "retrieval_kept", "retrieval_top_score", "error"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    day TEXT NOT NULL,
+    source TEXT,
+    class_name TEXT,
+    model TEXT,
+    question TEXT,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    total_tokens INTEGER DEFAULT 0,
+    cached_tokens INTEGER DEFAULT 0,
+    cost REAL DEFAULT 0,
+    latency_ms REAL,
+    cache_hit TEXT,
+    retrieval_candidates INTEGER,
+    retrieval_kept INTEGER,
+    retrieval_top_score REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_usage_events_day ON usage_events (day);
+CREATE INDEX IF NOT EXISTS idx_usage_events_class_day ON usage_events (class_name, day);
+"""
+
+# Columns added after the first release: name -> SQL type, added to existing databases on startup
+ADDED_COLUMNS = {
+    "cached_tokens": "INTEGER DEFAULT 0",
+}
+
+# Aggregation keys accepted by summarize()
+GROUP_BY_COLUMNS = {
+    "class": ["class_name"],
+    "day": ["day"],
+    "model": ["model"],
+    "source": ["source"],
+    "class_day": ["class_name", "day"],
+}
+
+
+class UsageLedger:
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000
+    ):
+        """
+        Initialize the append-only usage ledger.
+
+        Events are queued in memory and written to SQLite in batches by a
+        background thread, so recording never blocks a request. Each gunicorn
+        worker has its own writer; WAL mode lets them share the database.
+
+        Args:
+            db_path: Path of the SQLite database (optional, defaults to the data volume)
+            batch_size: Maximum number of events written per transaction
+            flush_interval: Seconds to wait for more events before writing a partial batch
+            max_queue: Maximum number of unwritten events; further events are dropped
+        """
+        self.db_path = db_path or os.path.join(get_data_dir("usage"), "usage.sqlite3")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+        connection = self._connect()
+        try:
+            connection.executescript(SCHEMA)
+            self._add_missing_columns(connection)
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _add_missing_columns(self, connection: sqlite3.Connection) -> None:
+        existing = {row["name"] for row in connection.execute("PRAGMA table_info(usage_events)")}
+        for column, column_type in ADDED_COLUMNS.items():
+            if column in existing:
+                continue
+            try:
+                connection.execute(f"ALTER TABLE usage_events ADD COLUMN {column} {column_type}")
+            except sqlite3.OperationalError as e:
+                # Another worker may have added it first
+                if "duplicate column" not in str(e):
+                    raise
+
+    def _ensure_writer(self) -> None:
+        # Start lazily and again after a fork, since threads don't survive into gunicorn workers
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._writer_loop, name="usage-ledger", daemon=True)
+            self._thread.start()
+
+    def _writer_loop(self) -> None:
+        connection = self._connect()
+        placeholders = ", ".join("?" for _ in EVENT_COLUMNS)
+        insert_sql = f"INSERT INTO usage_events ({', '.join(EVENT_COLUMNS)}) VALUES ({placeholders})"
+
+        while True:
+            event = self._queue.get()
+            stop = event is None
+            batch = [] if stop else [event]
+
+            # Gather whatever else arrives shortly so writes are batched
+            deadline = time.monotonic() + self.flush_interval
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if event is None:
+                    stop = True
+                else:
+                    batch.append(event)
+
+            if batch:
+                try:
+                    with connection:
+                        connection.executemany(insert_sql, [tuple(e.get(c) for c in EVENT_COLUMNS) for e in batch])
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    self.write_errors += 1
+                    print(f"Error writing {len(batch)} usage events: {e}")
+
+            if stop:
+                connection.close()
+                return
+
+    def record(self, event: Dict[str, Any]) -> None:
+        """
+        Queue a usage event without blocking.
+
+        Args:
+            event: Event fields (see EVENT_COLUMNS); timestamp and day are filled in if missing
+        """
+        timestamp = event.get("timestamp") or time.time()
+        event = dict(event, timestamp=timestamp)
+        event.setdefault("day", datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d"))
+
+        question = event.get("question")
+        event["question"] = question[:MAX_QUESTION_LENGTH] if STORE_QUESTIONS and question else None
+
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_response(
+        self,
+        source: str,
+        class_name: str,
+        model: Optional[str],
+        question: str,
+        response: Dict[str, Any],
+        latency_ms: float
+    ) -> None:
+        """Queue a usage event built from a chatbot response dictionary."""
+        retrieval = response.get("retrieval") or {}
+        cache_hit = "faq" if response.get("faq_match") else None
+
+        self.record({
+            "source": source,
+            "class_name": class_name,
+            "model": model if response.get("tokens_used") else None,
+            "question": question,
+            "prompt_tokens": response.get("prompt_tokens", 0),
+            "completion_tokens": response.get("completion_tokens", 0),
+            "total_tokens": response.get("tokens_used", 0),
+            "cached_tokens": response.get("cached_tokens", 0),
+            "cost": response.get("cost", 0.0),
+            "latency_ms": round(latency_ms, 1),
+            "cache_hit": cache_hit,
+            "retrieval_candidates": retrieval.get("candidates"),
+            "retrieval_kept": retrieval.get("kept"),
+            "retrieval_top_score": retrieval.get("top_score"),
+            "error": response.get("error")
+        })
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Stop the writer after it has written all queued events."""
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _since_clause(self, days: Optional[int], class_name: Optional[str]) -> Tuple[str, List[Any]]:
+        conditions, params = [], []
+        if days:
+            since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+            conditions.append("day >= ?")
+            params.append(since)
+        if class_name:
+            conditions.append("class_name = ?")
+            params.append(class_name)
+        return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+    def summarize(
+        self,
+        group_by: str = "class",
+        days: Optional[int] = 30,
+        class_name: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Aggregate usage by class, day, model or source.
+
+        Args:
+            group_by: One of 'class', 'day', 'model', 'source' or 'class_day'
+            days: Only include the last this many days (optional)
+            class_name: Only include this class (optional)
+
+        Returns:
+            One row per group, most expensive first
+        """
+        if group_by not in GROUP_BY_COLUMNS:
+            raise ValueError(f"group_by must be one of: {', '.join(GROUP_BY_COLUMNS)}")
+
+        columns = ", ".join(GROUP_BY_COLUMNS[group_by])
+        where, params = self._since_clause(days, class_name)
+        order = "day" if group_by == "day" else "cost DESC"
+
+        query = f"""
+            SELECT {columns},
+                   COUNT(*) AS requests,
+                   SUM(total_tokens) AS total_tokens,
+                   SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(completion_tokens) AS completion_tokens,
+                   SUM(cached_tokens) AS cached_tokens,
+                   ROUND(SUM(cost), 6) AS cost,
+                   ROUND(AVG(latency_ms), 1) AS avg_latency_ms,
+                   MAX(latency_ms) AS max_latency_ms,
+                   SUM(cache_hit IS NOT NULL) AS cache_hits,
+                   SUM(retrieval_kept = 0) AS no_context,
+                   ROUND(AVG(retrieval_kept), 2) AS avg_chunks_used,
+                   SUM(error IS NOT NULL) AS errors
+            FROM usage_events {where}
+            GROUP BY {columns}
+            ORDER BY {order}
+        """
+        connection = self._connect()
+        try:
+            return [dict(row) for row in connection.execute(query, params)]
+        finally:
+            connection.close()
+
+    def top_questions(
+        self,
+        class_name: Optional[str] = None,
+        days: Optional[int] = 30,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the questions that cost the most, grouping repeats case-insensitively.
+
+        Args:
+            class_name: Only include this class (optional)
+            days: Only include the last this many days (optional)
+            limit: Maximum number of questions
+
+        Returns:
+            Rows with the question, how often it was asked and its total cost
+        """
+        where, params = self._since_clause(days, class_name)
+        where = f"{where} AND question IS NOT NULL" if where else "WHERE question IS NOT NULL"
+
+        query = f"""
+            SELECT MIN(question) AS question,
+                   class_name,
+                   COUNT(*) AS times_asked,
+                   SUM(total_tokens) AS total_tokens,
+                   ROUND(SUM(cost), 6) AS cost,
+                   SUM(cache_hit IS NOT NULL) AS cache_hits
+            FROM usage_events {where}
+            GROUP BY LOWER(TRIM(question)), class_name
+            ORDER BY cost DESC, times_asked DESC
+            LIMIT ?
+        """
+        connection = self._connect()
+        try:
+            return [dict(row) for row in connection.execute(query, params + [limit])]
+        finally:
+            connection.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get writer statistics for this process."""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors
+        }
+
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """Get the shared usage ledger for this process."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger()
+            atexit.register(_ledger.flush)
+        return _ledger
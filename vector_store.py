@@ -1,9 +1,14 @@
 import os
 from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from class_manifest import load_class_manifest, delete_class_manifest
+from faq_cache import delete_faq_cache
+from embedding_providers import (
+    resolve_embedding_config, get_class_embedding_config, get_embeddings
+)
 
 # Load environment variables
 load_dotenv()
@@ -35,11 +40,13 @@ class VectorStoreManager:
         # Initialize OpenAI API key
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         
-        # Initialize OpenAI embeddings
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=self.openai_api_key,
-            model="text-embedding-3-small"
-        )
+        # Embeddings for new classes; existing classes use the provider recorded in their manifest
+        self.embedding_config = resolve_embedding_config()
+        self.embeddings = get_embeddings(self.embedding_config, self.openai_api_key)
+    
+    def get_class_embeddings(self, class_name: str) -> Embeddings:
+        """Get the embeddings a class was built with, so queries match its index."""
+        return get_embeddings(get_class_embedding_config(class_name), self.openai_api_key)
     
     def get_collection_path(self, class_name: str) -> str:
         """Get the path to a collection directory."""
@@ -79,7 +86,7 @@ class VectorStoreManager:
             # Load vector store with persistence
             vector_store = Chroma(
                 collection_name=collection_name,
-                embedding_function=self.embeddings,
+                embedding_function=self.get_class_embeddings(class_name),
                 persist_directory=collection_path
             )
             
@@ -88,54 +95,6 @@ class VectorStoreManager:
             print(f"Error loading vector store for class '{class_name}': {e}")
             return None
     
-    def create_vector_store(self, documents: List[Document], class_name: str) -> Any:
-        """
-        Create a vector store from documents.
-        
-        Args:
-            documents: List of LangChain Document objects
-            class_name: Name of the class
-            
-        Returns:
-            Chroma vector store or None if failed
-        """
-        if not documents:
-            print("No documents to create vector store from")
-            return None
-        
-        try:
-            # Create a sanitized collection name
-            collection_name = class_name.replace(" ", "_").lower()
-            
-            # Get the collection path
-            collection_path = self.get_collection_path(class_name)
-            
-            # Create directory if it doesn't exist
-            os.makedirs(collection_path, exist_ok=True)
-            
-            # Create vector store
-            vector_store = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                persist_directory=collection_path,
-                collection_name=collection_name
-            )
-            
-            # Explicitly persist the vector store
-            try:
-                if hasattr(vector_store, 'persist'):
-                    vector_store.persist()
-                    print(f"Vector store persisted at {collection_path}")
-            except Exception as e:
-                print(f"Warning: Could not persist vector store, but it should still be usable: {e}")
-            
-            print(f"Created vector store for class '{class_name}' with {len(documents)} documents")
-            return vector_store
-            
-        except Exception as e:
-            print(f"Error creating vector store: {e}")
-            return None
-            
     def query_vector_store(
         self, 
         class_name: str, 
@@ -176,6 +135,61 @@ class VectorStoreManager:
             print(f"Error querying vector store: {e}")
             return [], []
     
+    def query_vector_store_by_vector(
+        self,
+        class_name: str,
+        embedding: List[float],
+        n_results: int = 5
+    ) -> Tuple[List[Document], List[float]]:
+        """
+        Query a vector store with a precomputed query embedding.
+        
+        Args:
+            class_name: Name of the class
+            embedding: Query embedding
+            n_results: Number of results to return
+            
+        Returns:
+            Tuple of (documents, relevance scores) or ([], []) if error
+        """
+        vector_store = self.get_vector_store(class_name)
+        
+        if not vector_store:
+            return [], []
+        
+        try:
+            documents_with_scores = self.search_by_vector(vector_store, embedding, n_results)
+            
+            documents = [doc for doc, _ in documents_with_scores]
+            scores = [score for _, score in documents_with_scores]
+            
+            return documents, scores
+        except Exception as e:
+            print(f"Error querying vector store: {e}")
+            return [], []
+    
+    @staticmethod
+    def search_by_vector(vector_store: Chroma, embedding: List[float], n_results: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Search a loaded vector store with a query embedding.
+        
+        Args:
+            vector_store: Chroma vector store
+            embedding: Query embedding
+            n_results: Number of results to return
+            
+        Returns:
+            List of (document, relevance score) tuples
+        """
+        # Convert distances to the same relevance scores as similarity_search_with_relevance_scores
+        documents_with_distances = vector_store.similarity_search_by_vector_with_relevance_scores(
+            embedding=embedding,
+            k=n_results
+        )
+        relevance_score_fn = vector_store._select_relevance_score_fn()
+        
+        return [(doc, relevance_score_fn(distance)) for doc, distance in documents_with_distances]
+    
     def list_available_classes(self) -> List[str]:
         """
         List all available classes in the database.
@@ -245,7 +259,8 @@ class VectorStoreManager:
                 "exists": True,
                 "class_name": class_name,
                 "document_count": count,
-                "document_types": list(document_types)
+                "document_types": list(document_types),
+                "chunking_profile": load_class_manifest(class_name).get("chunking_profile")
             }
         except Exception as e:
             print(f"Error getting class info: {e}")
@@ -280,6 +295,10 @@ class VectorStoreManager:
             import shutil
             shutil.rmtree(collection_path)
             
+            # Remove the build manifest and precomputed FAQ answers
+            delete_class_manifest(class_name)
+            delete_faq_cache(class_name)
+            
             print(f"Deleted class '{class_name}'")
             return True
         except Exception as e: